@@ -1,13 +1,27 @@
 import os
 import sys
+from datetime import datetime, timezone
+from uuid import uuid4
 from dotenv import load_dotenv
-from flask import Flask, request, session, jsonify
-from flask_socketio import SocketIO
+from flask import Flask, Response, request, session, jsonify
 from flask_migrate import Migrate
-from server import create_app
-from server.api_utils import fetch_and_add_events
-from server.models import User, Event, ChatMessage, FriendRequest, EventPhoto, DirectMessage, UserBlock
+from flask_socketio import join_room
+from server import create_app, socketio, chat_room, chat_event, user_room, LOUNGE_ROOM_ID, LOUNGE_HISTORY_SIZE
+from server.chat_history import room_history, chat_payload
+from server.socket_identity import socket_identities
+from server.metrics import metrics
+from server.import_jobs import ImportScheduler
+from server.models import User, Event, ChatMessage, FriendRequest, EventPhoto, DirectMessage, UserBlock, Conversation, user_event
 from server.extensions import db, bcrypt
+from server.pagination import encode_cursor, decode_cursor, parse_limit, parse_int_arg, parse_date_arg
+from server.write_behind import MessageWriteBuffer
+from server.block_cache import invalidate_block_sets
+from server.conversations import (
+    conversation_pair, conversation_id_for, assign_conversations, record_direct_messages,
+    mark_conversation_read, unread_total, recent_conversations, parse_conversation_cursor,
+    conversation_page_cursor, sync_changes
+)
+from server.serializers import USER_SCHEMA, EVENT_SCHEMA, FRIEND_REQUEST_SCHEMA, iter_json_array, stream_json, wants_stream
 from flask_cors import CORS
 import cloudinary.uploader
 import cloudinary.api
@@ -21,8 +35,17 @@ app = create_app()
 
 CORS(app, supports_credentials=True)
 
-# Initialize SocketIO
-socketio = SocketIO(app, cors_allowed_origins="*")
+# Optional group-commit buffer for socket chat writes (see CHAT_WRITE_BEHIND)
+chat_write_buffer = None
+if app.config['CHAT_WRITE_BEHIND']:
+    chat_write_buffer = MessageWriteBuffer(
+        app,
+        max_batch=app.config['CHAT_FLUSH_BATCH_SIZE'],
+        max_delay=app.config['CHAT_FLUSH_INTERVAL']
+    )
+    # Conversation keys and unread counters are set in the same transaction as each batch of DMs
+    chat_write_buffer.before_insert(DirectMessage, assign_conversations)
+    chat_write_buffer.after_insert(DirectMessage, record_direct_messages)
 
 # Cloudinary configuration
 cloudinary.config(
@@ -66,9 +89,19 @@ def upload_image_endpoint():
 # Initialize Flask-Migrate
 migrate = Migrate(app, db)
 
-# Fetch events when the app starts up (if needed)
-with app.app_context():
-   fetch_and_add_events()
+# Event imports run on a background thread, started with the first request so that
+# CLI commands (flask db upgrade, seed.py) never reach out to EDMTrain
+import_scheduler = ImportScheduler(
+    app,
+    interval=app.config['EVENT_IMPORT_INTERVAL'],
+    mode=app.config['EVENT_IMPORT_MODE'],
+    scheduler=app.config['EVENT_IMPORT_SCHEDULER'],
+    poll_interval=app.config['EVENT_IMPORT_POLL_INTERVAL']
+)
+
+@app.before_request
+def start_import_scheduler():
+    import_scheduler.start()
 
 # Example root route
 @app.route('/')
@@ -80,14 +113,18 @@ def favicon():
     return "", 204
 
 
-# Fetch and import events route
+# Fetch and import events routes
 @app.route('/api/import-events', methods=['POST'])
 def import_events():
-    try:
-        fetch_and_add_events()
-        return {"message": "Events imported successfully."}, 200
-    except Exception as e:
-        return {"error": str(e)}, 500
+    job_id = import_scheduler.submit()
+    return import_scheduler.get_job(job_id), 202
+
+@app.get('/api/import-events/<job_id>')
+def get_import_job(job_id):
+    job = import_scheduler.get_job(job_id)
+    if not job:
+        return {"error": "Import job not found"}, 404
+    return job, 200
     
 # User login and authentication routes
 @app.post('/api/users')
@@ -175,7 +212,9 @@ def get_current_user():
 # User management routes
 @app.get('/api/users')
 def get_users():
-    users = [user.to_dict() for user in User.query.all()]
+    if wants_stream(request):
+        return stream_json(iter_json_array(USER_SCHEMA, User.query.order_by(User.id)))
+    users = USER_SCHEMA.serialize_many(USER_SCHEMA.query(User.query).all())
     return jsonify(users), 200
 
 @app.get('/api/users/<int:id>')
@@ -256,6 +295,7 @@ def block_user(user_id):
         db.session.delete(request)
     
     db.session.commit()
+    invalidate_block_sets(blocker_id, user_id)
     
     return jsonify({'message': 'User blocked successfully'}), 201
 
@@ -280,6 +320,7 @@ def unblock_user(user_id):
     # Remove the block
     db.session.delete(block)
     db.session.commit()
+    invalidate_block_sets(blocker_id, user_id)
     
     return jsonify({'message': 'User unblocked successfully'}), 200
 
@@ -338,7 +379,49 @@ def check_block_status(user_id):
 # Event routes
 @app.get('/api/events')
 def get_events():
-    return [event.to_dict() for event in Event.query.all()], 200
+    # Without any paging/filter arguments keep returning the full list for older clients
+    if not any(arg in request.args for arg in ('after', 'limit', 'from', 'to', 'city')):
+        if wants_stream(request):
+            return stream_json(iter_json_array(EVENT_SCHEMA, Event.query.order_by(Event.id)))
+        return jsonify(EVENT_SCHEMA.serialize_many(EVENT_SCHEMA.query(Event.query).all())), 200
+
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        date_from = parse_date_arg(request.args.get('from'), 'from')
+        date_to = parse_date_arg(request.args.get('to'), 'to')
+        after = request.args.get('after')
+        if after:
+            after_date, after_id = decode_cursor(after)
+            after_date = parse_date_arg(after_date, 'after')
+            after_id = int(after_id)
+    except (ValueError, TypeError) as e:
+        return {'error': str(e)}, 400
+
+    # Keyset pagination on (starts_on, id), served by ix_events_table_(city_)starts_on_id
+    query = Event.query.filter(Event.starts_on.isnot(None))
+    city = request.args.get('city')
+    if city:
+        query = query.filter(Event.city == city)
+    if date_from:
+        query = query.filter(Event.starts_on >= date_from)
+    if date_to:
+        query = query.filter(Event.starts_on <= date_to)
+    if after:
+        query = query.filter(db.tuple_(Event.starts_on, Event.id) > db.tuple_(after_date, after_id))
+
+    events = EVENT_SCHEMA.query(query) \
+        .order_by(Event.starts_on, Event.id) \
+        .limit(limit + 1) \
+        .all()
+
+    has_more = len(events) > limit
+    events = events[:limit]
+    next_cursor = encode_cursor(events[-1].starts_on, events[-1].id) if has_more else None
+
+    return {
+        'events': EVENT_SCHEMA.serialize_many(events),
+        'next_cursor': next_cursor
+    }, 200
 
 @app.get('/api/events/<int:id>')
 def get_one_event(id):
@@ -423,12 +506,21 @@ def get_friend_requests():
         return jsonify({"error": "Unauthorized"}), 401
 
     user_id = session["user_id"]
-    sent_requests = FriendRequest.query.filter_by(sender_id=user_id).all()
-    received_requests = FriendRequest.query.filter_by(receiver_id=user_id).all()
+    if wants_stream(request):
+        def chunks():
+            yield '{"sent_requests": '
+            yield from iter_json_array(FRIEND_REQUEST_SCHEMA, FriendRequest.query.filter_by(sender_id=user_id))
+            yield ', "received_requests": '
+            yield from iter_json_array(FRIEND_REQUEST_SCHEMA, FriendRequest.query.filter_by(receiver_id=user_id))
+            yield '}'
+        return stream_json(chunks())
+
+    sent_requests = FRIEND_REQUEST_SCHEMA.query(FriendRequest.query.filter_by(sender_id=user_id)).all()
+    received_requests = FRIEND_REQUEST_SCHEMA.query(FriendRequest.query.filter_by(receiver_id=user_id)).all()
 
     return jsonify({
-        "sent_requests": [req.to_dict() for req in sent_requests],
-        "received_requests": [req.to_dict() for req in received_requests]
+        "sent_requests": FRIEND_REQUEST_SCHEMA.serialize_many(sent_requests),
+        "received_requests": FRIEND_REQUEST_SCHEMA.serialize_many(received_requests)
     }), 200
 
 @app.post("/api/friend-request")
@@ -437,7 +529,11 @@ def send_friend_request():
         return jsonify({"error": "Unauthorized"}), 401
 
     sender_id = session["user_id"]
-    receiver_id = request.json.get("receiver_id")
+    try:
+        # Clients may send the id as a string; block sets and the self check compare ints
+        receiver_id = int(request.json.get("receiver_id"))
+    except (TypeError, ValueError):
+        return jsonify({"error": "receiver_id must be an integer"}), 400
 
     if sender_id == receiver_id:
         return jsonify({"error": "You can't send a request to yourself"}), 400
@@ -530,26 +626,30 @@ def get_rsvped_users(event_id):
         if not event:
             return jsonify({'error': 'Event not found'}), 404
 
-        rsvped_users = event.attendees
+        # Attendees by event via ix_user_event_event_id_user_id, with only the columns we return
+        rsvped_users = USER_SCHEMA.query(
+            User.query.join(user_event, user_event.c.user_id == User.id)
+            .filter(user_event.c.event_id == event_id)
+        ).all()
 
         # If no user is logged in, return all RSVP'd users
         if 'user_id' not in session:
             return jsonify({
-                'all_users': [user.to_dict() for user in rsvped_users]
+                'all_users': USER_SCHEMA.serialize_many(rsvped_users)
             }), 200
 
         # If user is logged in, filter out blocked users and separate friends
         current_user = User.query.get(session['user_id'])
-        friends = current_user.friends
+        friend_ids = {friend.id for friend in current_user.friends}
 
-        # Filter out users with blocking relationships
+        # Filter out users with blocking relationships (one block query for the whole list)
         filtered_users = [
             user for user in rsvped_users 
             if not current_user.is_blocking_relationship(user.id)
         ]
 
-        rsvped_friends = [user.to_dict() for user in filtered_users if user in friends]
-        other_rsvped_users = [user.to_dict() for user in filtered_users if user not in friends]
+        rsvped_friends = [USER_SCHEMA.serialize(user) for user in filtered_users if user.id in friend_ids]
+        other_rsvped_users = [USER_SCHEMA.serialize(user) for user in filtered_users if user.id not in friend_ids]
 
         return jsonify({
             'friends': rsvped_friends,
@@ -564,72 +664,136 @@ def get_rsvped_users(event_id):
 @app.route("/api/events/<int:id>/chat_messages", methods=["GET"])
 def get_chat_messages(id):
     try:
-        # Query chat messages based on event_id
-        messages = ChatMessage.query.filter_by(event_id=id).all()
-
-        if not messages:
-            print(f"No messages found for event ID {id}")
-            return jsonify([]), 200  # Return empty array if no messages found
-
-        # Prepare the response in the desired format
-        result = [
-            {
-                "id": msg.id,
-                "username": msg.username,
-                "message": msg.message,
-                "timestamp": msg.timestamp.isoformat(),  # Ensure timestamp is in ISO format
-            }
-            for msg in messages
-        ]
+        # Column projection only, so the joined event/user relationships are never loaded
+        query = db.session.query(
+            ChatMessage.id,
+            ChatMessage.uuid,
+            ChatMessage.username,
+            ChatMessage.message,
+            ChatMessage.timestamp
+        ).filter(ChatMessage.event_id == id)
+
+        paginated = 'before' in request.args or 'limit' in request.args
+        if paginated:
+            try:
+                limit = parse_limit(request.args.get('limit'))
+                before = parse_int_arg(request.args.get('before'), 'before')
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
+            if before is None:
+                # The latest page comes from the room's in-memory buffer (the database with write-behind)
+                recent, has_more = room_history.latest(chat_room(id), id, limit)
+                result = list(reversed(recent))
+            else:
+                # Older newest-first pages walk ix_chat_message_event_id_id backwards
+                messages = query.filter(ChatMessage.id < before).order_by(ChatMessage.id.desc()).limit(limit + 1).all()
+                has_more = len(messages) > limit
+                result = [chat_payload(msg) for msg in messages[:limit]]
+
+            # Every row here is stored, so the oldest one on the page has an id
+            return jsonify({
+                "messages": result,
+                "next_before": result[-1]["id"] if has_more else None
+            }), 200
 
-        return jsonify(result), 200
+        messages = query.order_by(ChatMessage.id).all()
+        return jsonify([chat_payload(msg) for msg in messages]), 200
     except Exception as e:
         print(f"Error fetching chat messages for event ID {id}: {str(e)}")
         return jsonify({"error": "Error fetching chat messages"}), 500
 
 
+def save_chat_message(event_id, user_id, username, message):
+    """Persist a chat message (or queue it for group commit) and return its broadcast payload"""
+    # Clients de-duplicate on the uuid, which a queued message has before it has an id
+    message_uuid = str(uuid4())
+    if chat_write_buffer:
+        # Broadcast right away; the row is written with the next batch, so it has no id yet
+        values = chat_write_buffer.add(
+            ChatMessage,
+            event_id=event_id,
+            user_id=user_id,
+            username=username,
+            message=message,
+            uuid=message_uuid
+        )
+        return {
+            "id": None,
+            "seq": None,
+            "uuid": message_uuid,
+            "username": username,
+            "message": message,
+            "timestamp": values["timestamp"].isoformat()
+        }
+
+    new_message = ChatMessage(
+        event_id=event_id,
+        user_id=user_id,
+        username=username,
+        message=message,
+        uuid=message_uuid
+    )
+    db.session.add(new_message)
+    db.session.flush()
+    # The id doubles as the room's sequence number for replay after reconnects.
+    # Built before commit, which would expire the row and cost a reload query.
+    payload = chat_payload(new_message)
+    db.session.commit()
+
+    return payload
+
+@app.get('/api/_chat-write-buffer')
+def get_chat_write_buffer_stats():
+    if not chat_write_buffer:
+        return jsonify({"enabled": False}), 200
+    return jsonify({"enabled": True, **chat_write_buffer.stats()}), 200
+
+@app.get('/api/_metrics')
+def get_metrics():
+    """Prometheus scrape endpoint; every worker process reports its own numbers"""
+    if not metrics.enabled:
+        return jsonify({"error": "Metrics are disabled"}), 404
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @socketio.on("connect")
 def handle_connect():
+    # Resolve the user once from the session cookie sent with the handshake
+    socket_identities.authenticate(request.sid, session.get('user_id'))
     print(f"User connected: {request.sid}")
 
 @socketio.on("disconnect")
 def handle_disconnect():
+    socket_identities.forget(request.sid)
     print(f"User disconnected: {request.sid}")
 
 @socketio.on("send_message")
 def handle_send_message(data):
     """Handles incoming chat messages and broadcasts them."""
     event_id = data.get("event_id")
-    user_id = data.get("user_id")
+    identity = socket_identities.get(request.sid)
     
-    if not user_id:
+    if not identity:
         return {"error": "User not logged in"}, 401
 
-    user = User.query.get(user_id)
-    event = Event.query.get(event_id)
-
-    if not user or not event:
-        return {"error": "Invalid event or user"}, 404
+    # join_room checked that the event exists
+    if chat_room(event_id) not in identity.rooms:
+        return {"error": "Join the event's chat first"}, 403
+    # Picks up a rename made through any worker
+    if not socket_identities.refresh(request.sid, identity):
+        return {"error": "User not logged in"}, 401
 
     print("messages sent")
-    new_message = ChatMessage(
+    message_data = save_chat_message(
         event_id=event_id,
-        user_id=user_id,
-        username=user.username,
+        user_id=identity.user_id,
+        username=identity.username,
         message=data["message"]
     )
 
-    db.session.add(new_message)
-    db.session.commit()
-
-    message_data = {
-        "id": new_message.id,
-        "username": user.username,
-        "message": new_message.message,
-        "timestamp": new_message.timestamp.isoformat()
-    }
-
-    socketio.emit(f"receive_message_{event_id}", message_data)
+    # Deliver only to sockets that joined this event's room
+    socketio.emit(chat_event(event_id), message_data, to=chat_room(event_id))
+    room_history.append(chat_room(event_id), event_id, message_data)
 
     return message_data, 201
 
@@ -657,21 +821,10 @@ def check_rsvp_status(event_id):
 @app.route("/api/lounge/messages", methods=["GET"])
 def get_lounge_messages():
     try:
-        # Fetch recent lounge messages (e.g., limit to last 100)
-        messages = ChatMessage.query.filter_by(event_id="lounge").order_by(ChatMessage.timestamp).limit(100).all()
-        
-        # Prepare the response in the desired format
-        result = [
-            {
-                "id": msg.id,
-                "username": msg.username,
-                "message": msg.message,
-                "timestamp": msg.timestamp.isoformat(),
-            }
-            for msg in messages
-        ]
+        # The last 100 lounge messages, served from the room's in-memory buffer
+        messages, _ = room_history.latest(chat_room(LOUNGE_ROOM_ID), LOUNGE_ROOM_ID, LOUNGE_HISTORY_SIZE)
 
-        return jsonify(result), 200
+        return jsonify(messages), 200
     except Exception as e:
         print(f"Error fetching lounge messages: {str(e)}")
         return jsonify({"error": "Error fetching lounge messages"}), 500
@@ -679,35 +832,21 @@ def get_lounge_messages():
 @socketio.on("send_lounge_message")
 def handle_lounge_message(data):
     """Handles incoming lounge messages and broadcasts them."""
-    user_id = data.get("user_id")
+    identity = socket_identities.get(request.sid)
     
-    if not user_id:
+    if not identity or not socket_identities.refresh(request.sid, identity):
         return {"error": "User not logged in"}, 401
 
-    user = User.query.get(user_id)
-
-    if not user:
-        return {"error": "Invalid user"}, 404
-
     # Store the message with "lounge" as event_id
-    new_message = ChatMessage(
-        event_id="lounge",
-        user_id=user_id,
-        username=user.username,
+    message_data = save_chat_message(
+        event_id=LOUNGE_ROOM_ID,
+        user_id=identity.user_id,
+        username=identity.username,
         message=data["message"]
     )
 
-    db.session.add(new_message)
-    db.session.commit()
-
-    message_data = {
-        "id": new_message.id,
-        "username": user.username,
-        "message": new_message.message,
-        "timestamp": new_message.timestamp.isoformat()
-    }
-
-    socketio.emit("receive_lounge_message", message_data)
+    socketio.emit(chat_event(LOUNGE_ROOM_ID), message_data, to=chat_room(LOUNGE_ROOM_ID))
+    room_history.append(chat_room(LOUNGE_ROOM_ID), LOUNGE_ROOM_ID, message_data)
 
     return message_data, 201
 
@@ -818,11 +957,23 @@ def get_direct_messages(user_id):
     
     current_user_id = session['user_id']
     
-    # Get conversation between current user and specified user
-    messages = DirectMessage.query.filter(
-        ((DirectMessage.sender_id == current_user_id) & (DirectMessage.receiver_id == user_id)) |
-        ((DirectMessage.sender_id == user_id) & (DirectMessage.receiver_id == current_user_id))
-    ).order_by(DirectMessage.timestamp).all()
+    if user_id == current_user_id:
+        # Notes to oneself have no conversation row (conversation_id is NULL)
+        messages = DirectMessage.query.filter(
+            DirectMessage.sender_id == current_user_id,
+            DirectMessage.receiver_id == current_user_id
+        ).order_by(DirectMessage.id).all()
+        return jsonify([message.to_dict() for message in messages]), 200
+
+    # Get conversation between current user and specified user: one (conversation_id, id) range
+    user_a_id, user_b_id = conversation_pair(current_user_id, user_id)
+    messages = DirectMessage.query.join(
+        Conversation,
+        Conversation.id == DirectMessage.conversation_id
+    ).filter(
+        Conversation.user_a_id == user_a_id,
+        Conversation.user_b_id == user_b_id
+    ).order_by(DirectMessage.id).all()
     
     return jsonify([message.to_dict() for message in messages]), 200
 
@@ -832,56 +983,43 @@ def get_conversations():
         return jsonify({"error": "Unauthorized"}), 401
 
     current_user_id = session['user_id']
-    current_user = User.query.get(current_user_id)
-
-    # Find all users the current user has exchanged messages with
-    sent_to = db.session.query(DirectMessage.receiver_id).filter_by(sender_id=current_user_id).distinct().all()
-    received_from = db.session.query(DirectMessage.sender_id).filter_by(receiver_id=current_user_id).distinct().all()
 
-    # Combine and remove duplicates
-    conversation_user_ids = set([user_id for (user_id,) in sent_to] + [user_id for (user_id,) in received_from])
+    # Without ?limit= or ?after= keep returning the full list for older clients
+    paged = any(arg in request.args for arg in ('limit', 'after'))
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        before = parse_conversation_cursor(request.args.get('after'))
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Keyset pagination on (last_timestamp, id); one extra row tells whether another page exists
+    rows = recent_conversations(current_user_id, limit + 1 if paged else None, before).add_columns(
+        User.photo_url,
+        DirectMessage.message,
+        db.case(
+            (Conversation.user_a_id == current_user_id, Conversation.user_a_unread_count),
+            else_=Conversation.user_b_unread_count
+        ).label('unread_count')
+    ).all()
 
-    conversations = []
-    for user_id in conversation_user_ids:
-        # Skip if there's a blocking relationship
-        if current_user.is_blocking_relationship(user_id):
-            continue
-            
-        user = User.query.get(user_id)
-        if user:
-            # Fetch the latest message for preview
-            latest_message = DirectMessage.query.filter(
-                ((DirectMessage.sender_id == current_user_id) & (DirectMessage.receiver_id == user_id)) |
-                ((DirectMessage.sender_id == user_id) & (DirectMessage.receiver_id == current_user_id))
-            ).order_by(DirectMessage.timestamp.desc()).first()
-
-            # Fetch all messages between current user and this user
-            messages = DirectMessage.query.filter(
-                ((DirectMessage.sender_id == current_user_id) & (DirectMessage.receiver_id == user_id)) |
-                ((DirectMessage.sender_id == user_id) & (DirectMessage.receiver_id == current_user_id))
-            ).order_by(DirectMessage.timestamp).all()
-
-            # Count unread messages
-            unread_count = DirectMessage.query.filter_by(
-                sender_id=user_id,
-                receiver_id=current_user_id,
-                is_read=False
-            ).count()
-
-            conversations.append({
-                "id": user.id,
-                "username": user.username,
-                "photo_url": user.photo_url,
-                "latest_message": latest_message.message if latest_message else "",
-                "latest_timestamp": latest_message.timestamp.isoformat() if latest_message else None,
-                "unread_count": unread_count,
-                "messages": [message.to_dict() for message in messages]
-            })
-
-    # Sort by latest message timestamp
-    conversations.sort(key=lambda x: x["latest_timestamp"] or "", reverse=True)
-
-    return jsonify(conversations), 200
+    conversations = [
+        {
+            "id": row.id,
+            "username": row.username,
+            "photo_url": row.photo_url,
+            "latest_message": row.message,
+            "latest_timestamp": row.last_timestamp.isoformat() if row.last_timestamp else None,
+            "unread_count": row.unread_count or 0
+        }
+        for row in (rows[:limit] if paged else rows)
+    ]
+
+    if not paged:
+        return jsonify(conversations), 200
+    return jsonify({
+        "conversations": conversations,
+        "next_cursor": conversation_page_cursor(rows, limit)
+    }), 200
 
 @app.route('/api/direct-messages/mark-read/<int:user_id>', methods=['POST'])
 def mark_messages_read(user_id):
@@ -890,85 +1028,111 @@ def mark_messages_read(user_id):
     
     current_user_id = session['user_id']
     
-    # Mark all messages from specified user to current user as read
-    unread_messages = DirectMessage.query.filter_by(
-        sender_id=user_id, 
-        receiver_id=current_user_id, 
-        is_read=False
-    ).all()
-    
-    for message in unread_messages:
-        message.is_read = True
-    
+    # Advance the read watermark and reset the maintained counters
+    mark_conversation_read(current_user_id, user_id)
     db.session.commit()
     
     return jsonify({"message": "Messages marked as read"}), 200
 
+def save_direct_message(sender_id, receiver_id, message):
+    """Persist a direct message (or queue it for group commit) and return its (id, uuid, timestamp)"""
+    # Clients de-duplicate on the uuid, which a queued message has before it has an id
+    message_uuid = str(uuid4())
+    if chat_write_buffer:
+        values = chat_write_buffer.add(
+            DirectMessage,
+            sender_id=sender_id,
+            receiver_id=receiver_id,
+            message=message,
+            is_read=False,
+            uuid=message_uuid
+        )
+        return None, message_uuid, values["timestamp"]
+
+    new_message = DirectMessage(
+        sender_id=sender_id,
+        receiver_id=receiver_id,
+        message=message,
+        conversation_id=conversation_id_for(sender_id, receiver_id),
+        uuid=message_uuid
+    )
+    db.session.add(new_message)
+    db.session.flush()
+    record_direct_messages([{
+        "sender_id": sender_id,
+        "receiver_id": receiver_id,
+        "conversation_id": new_message.conversation_id
+    }])
+    message_id, timestamp = new_message.id, new_message.timestamp
+    db.session.commit()
+    return message_id, message_uuid, timestamp
+
 #socket io for DMS
 
 @socketio.on("send_direct_message")
 def handle_direct_message(data):
     """Handles direct messages between users."""
-    sender_id = data.get("sender_id")
+    identity = socket_identities.get(request.sid)
     receiver_id = data.get("receiver_id")
     message_text = data.get("message")
     
-    if not sender_id or not receiver_id:
+    if not identity:
+        return {"error": "User not logged in"}, 401
+    if not receiver_id:
         return {"error": "Missing user information"}, 400
-    
-    sender = User.query.get(sender_id)
-    receiver = User.query.get(receiver_id)
-    
-    if not sender or not receiver:
+    try:
+        # Clients may send the id as a string; conversation pairs and block sets compare ints
+        receiver_id = int(receiver_id)
+    except (TypeError, ValueError):
+        return {"error": "receiver_id must be an integer"}, 400
+    sender_id = identity.user_id
+    
+    # One query re-reads the sender and checks the receiver and blocks, so account
+    # and block changes made through any worker apply to the very next message
+    sender = socket_identities.refresh(request.sid, identity, receiver_id)
+    if not sender:
+        return {"error": "User not logged in"}, 401
+    if not sender.receiver_exists:
         return {"error": "Invalid user"}, 404
-    
-    # Check for blocking relationships
-    if sender.is_blocking_relationship(receiver_id):
+    if sender.blocked:
         return {"error": "Cannot send message due to blocking"}, 403
     
-    # Store the message
-    new_message = DirectMessage(
-        sender_id=sender_id,
-        receiver_id=receiver_id,
-        message=message_text
-    )
-    
-    db.session.add(new_message)
-    db.session.commit()
-    
+    # Store the message, or queue it when write-behind is enabled
+    message_id, message_uuid, timestamp = save_direct_message(sender_id, receiver_id, message_text)
     message_data = {
-        "id": new_message.id,
+        "id": message_id,
+        "uuid": message_uuid,
         "sender_id": sender_id,
-        "sender_username": sender.username,
+        "sender_username": identity.username,
         "receiver_id": receiver_id,
         "message": message_text,
-        "timestamp": new_message.timestamp.isoformat(),
+        "timestamp": timestamp.isoformat(),
         "is_read": False
     }
     
-    # Emit to both sender and receiver channels
-    socketio.emit(f"receive_direct_message_{sender_id}_{receiver_id}", message_data)
-    socketio.emit(f"receive_direct_message_{receiver_id}_{sender_id}", message_data)
+    # Emit only to the sender's and receiver's personal rooms (every connected device of each)
+    socketio.emit(f"receive_direct_message_{sender_id}_{receiver_id}", message_data, to=user_room(sender_id))
+    socketio.emit(f"receive_direct_message_{receiver_id}_{sender_id}", message_data, to=user_room(receiver_id))
     
-    # Also emit to a general notification channel for the receiver
+    # Also emit a notification to the receiver's devices
     socketio.emit(f"message_notification_{receiver_id}", {
         "from_id": sender_id,
-        "from_username": sender.username,
+        "from_username": identity.username,
         "preview": message_text[:30] + ("..." if len(message_text) > 30 else "")
-    })
+    }, to=user_room(receiver_id))
     
     return message_data, 201
 
 @socketio.on("join_dm_room")
 def join_dm_room(data):
     """Joins a user to their direct message room."""
-    user_id = data.get("user_id")
+    identity = socket_identities.get(request.sid)
     
-    if not user_id:
-        return {"error": "User ID required"}, 400
+    if not identity:
+        return {"error": "User not logged in"}, 401
     
-    # Join a room for this user to receive notifications
-    socketio.join_room(f"user_{user_id}")
+    # Join the authenticated user's room to receive DMs and notifications; each device's sid joins separately
+    join_room(user_room(identity.user_id))
     return {"message": "Joined DM room"}, 200
 
 # unread messages
@@ -980,10 +1144,7 @@ def get_unread_count():
     
     current_user_id = session['user_id']
     
-    unread_count = DirectMessage.query.filter_by(
-        receiver_id=current_user_id, 
-        is_read=False
-    ).count()
+    unread_count = unread_total(current_user_id)
     
     return jsonify({"unread_count": unread_count}), 200
 
@@ -996,45 +1157,89 @@ def get_recent_messages():
     
     current_user_id = session['user_id']
     
-    # Use a subquery to get the most recent message for each conversation
-    subq = db.session.query(
-        DirectMessage.id,
-        db.func.max(DirectMessage.timestamp).label('max_timestamp'),
-        db.case(
-            [(DirectMessage.sender_id == current_user_id, DirectMessage.receiver_id)],
-            else_=DirectMessage.sender_id
-        ).label('other_user_id')
-    ).filter(
-        (DirectMessage.sender_id == current_user_id) | 
-        (DirectMessage.receiver_id == current_user_id)
-    ).group_by('other_user_id').subquery()
-    
-    recent_messages = db.session.query(
-        DirectMessage, 
-        User
-    ).join(
-        subq, 
-        DirectMessage.id == subq.c.id
-    ).join(
-        User, 
-        User.id == subq.c.other_user_id
+    # Without ?limit= or ?after= keep returning the full list for older clients
+    paged = any(arg in request.args for arg in ('limit', 'after'))
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        before = parse_conversation_cursor(request.args.get('after'))
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    rows = recent_conversations(current_user_id, limit + 1 if paged else None, before).add_columns(
+        User.photo_url,
+        DirectMessage.message,
+        DirectMessage.receiver_id,
+        DirectMessage.is_read
     ).all()
     
-    result = []
-    for message, user in recent_messages:
-        result.append({
-            "user_id": user.id,
-            "username": user.username,
-            "photo_url": user.photo_url,
-            "last_message": message.message,
-            "timestamp": message.timestamp.isoformat(),
-            "unread": message.receiver_id == current_user_id and not message.is_read
-        })
-    
-    # Sort by timestamp (newest first)
-    result.sort(key=lambda x: x["timestamp"], reverse=True)
-    
-    return jsonify(result), 200
+    result = [
+        {
+            "user_id": row.id,
+            "username": row.username,
+            "photo_url": row.photo_url,
+            "last_message": row.message,
+            "timestamp": row.last_timestamp.isoformat(),
+            "unread": row.receiver_id == current_user_id and not row.is_read
+        }
+        for row in (rows[:limit] if paged else rows)
+    ]
+    
+    if not paged:
+        return jsonify(result), 200
+    return jsonify({
+        "conversations": result,
+        "next_cursor": conversation_page_cursor(rows, limit)
+    }), 200
+
+# incremental sync
+
+@app.route('/api/direct-messages/sync', methods=['GET'])
+def sync_direct_messages():
+    """Messages, read-state changes and new conversations since a sync cursor"""
+    if 'user_id' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    current_user_id = session['user_id']
+    synced_at = datetime.now(timezone.utc)
+
+    try:
+        limit = parse_limit(request.args.get('limit'), default=200, maximum=1000)
+        since, after_id = None, None
+        cursor = request.args.get('since')
+        if cursor:
+            since, after_id = decode_cursor(cursor)
+            since = datetime.fromisoformat(since)
+            after_id = int(after_id) if after_id is not None else None
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    conversations, messages, has_more = sync_changes(current_user_id, since, limit, after_id)
+
+    # Page through a large catch-up from the same point, then move the cursor to this sync
+    if has_more:
+        next_cursor = encode_cursor(since, messages[-1].id)
+    else:
+        next_cursor = encode_cursor(synced_at, None)
+
+    return jsonify({
+        "conversations": [
+            {
+                "id": row.id,
+                "user_id": row.user_id,
+                "username": row.username,
+                "photo_url": row.photo_url,
+                "last_message_id": row.last_message_id,
+                "last_timestamp": row.last_timestamp.isoformat() if row.last_timestamp else None,
+                "unread_count": row.unread_count,
+                "last_read_message_id": row.last_read_message_id,
+                "partner_last_read_message_id": row.partner_last_read_message_id
+            }
+            for row in conversations
+        ],
+        "messages": [message.to_dict() for message in messages],
+        "cursor": next_cursor,
+        "has_more": has_more
+    }), 200
 
 @app.route('/api/direct-messages', methods=['POST'])
 def create_direct_message():
@@ -1048,6 +1253,11 @@ def create_direct_message():
 
     if not receiver_id or not message_text:
         return jsonify({"error": "Missing receiver_id or message text"}), 400
+    try:
+        # Clients may send the id as a string; conversation pairs compare ints
+        receiver_id = int(receiver_id)
+    except (TypeError, ValueError):
+        return jsonify({"error": "receiver_id must be an integer"}), 400
 
     # Verify sender and receiver exist
     sender = User.query.get(sender_id)
@@ -1064,14 +1274,22 @@ def create_direct_message():
     new_message = DirectMessage(
         sender_id=sender_id,
         receiver_id=receiver_id,
-        message=message_text
+        message=message_text,
+        conversation_id=conversation_id_for(sender_id, receiver_id)
     )
 
     db.session.add(new_message)
+    db.session.flush()
+    record_direct_messages([{
+        "sender_id": sender_id,
+        "receiver_id": receiver_id,
+        "conversation_id": new_message.conversation_id
+    }])
     db.session.commit()
 
     return jsonify(new_message.to_dict()), 201
 
 # Run the app
 if __name__ == '__main__':
+    import_scheduler.start()
     socketio.run(app, port=5550, debug=True)
\ No newline at end of file
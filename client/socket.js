@@ -1,5 +1,11 @@
 import { io } from "socket.io-client";
 
-const socket = io("http://localhost:5550"); // Backend URL
+// Send the session cookie with the handshake: the server identifies the socket's user once, at connect
+const socket = io("http://localhost:5550", { withCredentials: true }); // Backend URL
+
+// Reconnect after logging in or out so the server picks up the new session
+export function reconnectSocket() {
+  socket.disconnect().connect();
+}
 
 export default socket;
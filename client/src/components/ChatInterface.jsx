@@ -10,6 +10,11 @@ function ChatInterface({ messages, currentUser, selectedUser, onMessageSent }) {
     const socketConnection = io();
     setSocket(socketConnection);
 
+    // Join this user's DM room (again after any reconnect) to receive messages
+    socketConnection.on("connect", () => {
+      socketConnection.emit("join_dm_room", { user_id: currentUser.id });
+    });
+
     // Listen for direct messages
     socketConnection.on(
       `receive_direct_message_${currentUser.id}_${selectedUser}`,
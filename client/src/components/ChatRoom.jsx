@@ -1,5 +1,11 @@
 import socket from "../../socket.js";
-import { useEffect, useState } from "react";
+import { useEffect, useRef, useState } from "react";
+
+// Latest messages requested with join_room when the chat opens, and per older page
+const CHAT_BACKFILL = 100;
+
+// A message's identity: its uuid, which write-behind broadcasts carry before the row has an id
+const messageKey = (msg) => msg.uuid ?? msg.seq ?? msg.id;
 
 const ChatRoom = ({ event_id }) => {
   const [message, setMessage] = useState("");
@@ -10,6 +16,16 @@ const ChatRoom = ({ event_id }) => {
   const [userId, setUserId] = useState(null);
   const [eventInfo, setEventInfo] = useState(null);
   const [isArchived, setIsArchived] = useState(false);
+  // Whether the server holds messages older than the oldest one shown
+  const [hasOlder, setHasOlder] = useState(false);
+  const [isLoadingOlder, setIsLoadingOlder] = useState(false);
+  // Newest sequence number held, sent on (re)join so the server replays only what was missed
+  const lastSeq = useRef(null);
+
+  useEffect(() => {
+    const seqs = messages.map((msg) => msg.seq ?? msg.id).filter((seq) => seq != null);
+    lastSeq.current = seqs.length ? Math.max(...seqs) : null;
+  }, [messages]);
 
   useEffect(() => {
     // Fetch event data to check date
@@ -80,21 +96,7 @@ const ChatRoom = ({ event_id }) => {
         console.error("Error checking RSVP status:", err);
         setError("Failed to check event RSVP status");
       }
-
-      // Fetch existing messages
-      try {
-        const messagesResponse = await fetch(
-          `/api/events/${event_id}/chat_messages`
-        );
-        if (!messagesResponse.ok) {
-          throw new Error("Failed to fetch messages");
-        }
-        const messagesData = await messagesResponse.json();
-        setMessages(messagesData);
-      } catch (err) {
-        console.error("Error fetching messages:", err);
-        setError("Failed to load chat messages");
-      }
+      // Existing messages arrive with the join_room acknowledgement
     };
 
     fetchEventInfo();
@@ -104,18 +106,85 @@ const ChatRoom = ({ event_id }) => {
   useEffect(() => {
     if (isArchived || !isRsvped || !username || !userId) return;
 
-    // Listen for new messages
+    // Reload the full history over HTTP
+    const reloadMessages = async () => {
+      try {
+        const messagesResponse = await fetch(`/api/events/${event_id}/chat_messages`);
+        if (messagesResponse.ok) {
+          setMessages(await messagesResponse.json());
+          setHasOlder(false);
+        }
+      } catch (err) {
+        console.error("Error fetching messages:", err);
+      }
+    };
+
+    // Join the event's room (and rejoin after reconnects) so messages are delivered here.
+    // The first join returns the latest messages in its ack; rejoins replay only what was missed.
+    const joinRoom = () => {
+      const resume =
+        lastSeq.current != null ? { last_seq: lastSeq.current } : { backfill: CHAT_BACKFILL };
+      socket.emit("join_room", { event_id, username, ...resume }, (ack) => {
+        if (!ack) return;
+        if (ack.messages) {
+          setMessages(ack.messages);
+          // Older history is paged in on demand with loadOlderMessages
+          setHasOlder(Boolean(ack.has_more));
+        }
+        // Too much missed to replay
+        if (ack.complete === false) reloadMessages();
+      });
+    };
+    joinRoom();
+    socket.on("connect", joinRoom);
+
+    // Listen for new (and replayed) messages
     const eventChannel = `receive_message_${event_id}`;
     socket.on(eventChannel, (newMessage) => {
-      setMessages((prevMessages) => [...prevMessages, newMessage]);
+      setMessages((prevMessages) => {
+        const key = messageKey(newMessage);
+        return key != null && prevMessages.some((msg) => messageKey(msg) === key)
+          ? prevMessages
+          : [...prevMessages, newMessage];
+      });
     });
 
     // Cleanup when component unmounts
     return () => {
       socket.off(eventChannel);
+      socket.off("connect", joinRoom);
+      socket.emit("leave_room", { event_id, username });
     };
   }, [isArchived, isRsvped, username, userId, event_id]);
 
+  // Prepend the page of messages older than the oldest one shown
+  const loadOlderMessages = async () => {
+    const ids = messages.map((msg) => msg.id).filter((id) => id != null);
+    if (!ids.length || isLoadingOlder) return;
+
+    setIsLoadingOlder(true);
+    try {
+      const response = await fetch(
+        `/api/events/${event_id}/chat_messages?before=${Math.min(...ids)}&limit=${CHAT_BACKFILL}`
+      );
+      if (!response.ok) {
+        throw new Error("Failed to fetch older messages");
+      }
+      const page = await response.json();
+      // Pages come newest first
+      const older = [...page.messages].reverse();
+      setMessages((prevMessages) => {
+        const seen = new Set(prevMessages.map(messageKey));
+        return [...older.filter((msg) => !seen.has(messageKey(msg))), ...prevMessages];
+      });
+      setHasOlder(page.next_before != null);
+    } catch (err) {
+      console.error("Error fetching older messages:", err);
+    } finally {
+      setIsLoadingOlder(false);
+    }
+  };
+
   const handleRsvp = async () => {
     try {
       const response = await fetch(`/api/events/${event_id}/rsvp`, {
@@ -155,7 +224,7 @@ const ChatRoom = ({ event_id }) => {
         <div className="messages archived-messages">
           {messages.length > 0 ? (
             messages.map((msg, index) => (
-              <div key={msg.id || index} className="message">
+              <div key={messageKey(msg) ?? index} className="message">
                 <strong>{msg.username}</strong>: {msg.message}
                 <small>{new Date(msg.timestamp).toLocaleTimeString()}</small>
               </div>
@@ -185,10 +254,15 @@ const ChatRoom = ({ event_id }) => {
   return (
     <div className="chat-room">
       <div className="messages">
+        {hasOlder && (
+          <button onClick={loadOlderMessages} disabled={isLoadingOlder}>
+            {isLoadingOlder ? "Loading..." : "Load older messages"}
+          </button>
+        )}
         {messages.length > 0 ? (
           messages.map((msg, index) => (
             <div
-              key={msg.id || index}
+              key={messageKey(msg) ?? index}
               className={`message ${
                 msg.username === username ? "my-message" : "other-message"
               }`}
@@ -1,5 +1,6 @@
 import { useState } from "react";
 import { useOutletContext, useNavigate } from "react-router-dom";
+import { reconnectSocket } from "../../socket.js";
 
 function LogInComponent() {
   const [email, setEmail] = useState("");
@@ -19,6 +20,7 @@ function LogInComponent() {
       body: JSON.stringify({ email, password }),
     }).then((response) => {
       if (response.ok) {
+        reconnectSocket();
         check_session();
         navigate("/");
       } else {
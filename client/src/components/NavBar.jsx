@@ -1,5 +1,6 @@
 import { useState } from "react";
 import { NavLink, useNavigate } from "react-router-dom";
+import { reconnectSocket } from "../../socket.js";
 import "../index.css";
 
 // eslint-disable-next-line react/prop-types
@@ -16,6 +17,7 @@ function NavBar({ currentUser, setCurrentUser, burgerIsOpen, setBurgerIsOpen })
     })
       .then((response) => {
         if (response.ok) {
+          reconnectSocket();
           setCurrentUser(null);
           alert("Logged out successfully!");
           navigate("/");
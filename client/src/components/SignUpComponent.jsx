@@ -1,5 +1,6 @@
 import { useState } from "react";
 import { useOutletContext, useNavigate } from "react-router-dom";
+import { reconnectSocket } from "../../socket.js";
 
 function SignUpComponent() {
   const [userName, setUserName] = useState("");
@@ -73,6 +74,7 @@ function SignUpComponent() {
 
       if (response.ok) {
         const newUser = await response.json();
+        reconnectSocket();
         setCurrentUser(newUser);
         navigate("/");
       } else {
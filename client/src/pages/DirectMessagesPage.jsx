@@ -2,11 +2,14 @@ import React, { useState, useEffect } from "react";
 import Modal from "react-modal"; // Import react-modal
 import { useOutletContext, useLocation } from "react-router-dom"; // Add useLocation for navigation state
 
+// Conversations fetched per page; the server pages only when ?limit= or ?after= is given
+const CONVERSATION_PAGE_SIZE = 50;
+
 // Set the app element for accessibility
 Modal.setAppElement("#root");
 
 // ConversationsList component
-function ConversationsList({ conversations, openConversation }) {
+function ConversationsList({ conversations, openConversation, hasMore, isLoadingMore, loadMore }) {
   const conversationsList = conversations || [];
 
   return (
@@ -40,6 +43,11 @@ function ConversationsList({ conversations, openConversation }) {
           </div>
         ))
       )}
+      {hasMore && (
+        <button onClick={loadMore} disabled={isLoadingMore}>
+          {isLoadingMore ? "Loading..." : "Load older conversations"}
+        </button>
+      )}
     </div>
   );
 }
@@ -307,6 +315,9 @@ function DirectMessagesPage() {
   const location = useLocation(); // Use location to read navigation state
 
   const [conversations, setConversations] = useState([]);
+  // Cursor for the next (older) page of conversations; null once all are loaded
+  const [nextCursor, setNextCursor] = useState(null);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
   const [friends, setFriends] = useState([]);
   const [isLoading, setIsLoading] = useState(true);
   const [error, setError] = useState(null);
@@ -345,7 +356,7 @@ function DirectMessagesPage() {
       try {
         setIsLoading(true);
         setError(null);
-        const response = await fetch(`/api/direct-messages/conversations`, {
+        const response = await fetch(`/api/direct-messages/conversations?limit=${CONVERSATION_PAGE_SIZE}`, {
           method: "GET",
           credentials: "include",
         });
@@ -354,8 +365,10 @@ function DirectMessagesPage() {
           throw new Error(`Failed to fetch: ${response.status}`);
         }
 
-        const data = await response.json();
-        setConversations(data || []);
+        const page = await response.json();
+        const data = page.conversations || [];
+        setConversations(data);
+        setNextCursor(page.next_cursor);
 
         // Automatically open a specific conversation if passed in state
         const openConversationWith = location.state?.openConversationWith;
@@ -383,6 +396,7 @@ function DirectMessagesPage() {
         console.error("Failed to fetch conversations:", error);
         setError("Failed to load conversations. Please try again later.");
         setConversations([]);
+        setNextCursor(null);
       } finally {
         setIsLoading(false);
       }
@@ -391,6 +405,33 @@ function DirectMessagesPage() {
     fetchConversations();
   }, [currentUser?.id, location.state, friends]); // Re-fetch when user, navigation state, or friends change
 
+  const loadMoreConversations = async () => {
+    if (!nextCursor || isLoadingMore) return;
+
+    try {
+      setIsLoadingMore(true);
+      const response = await fetch(
+        `/api/direct-messages/conversations?limit=${CONVERSATION_PAGE_SIZE}&after=${encodeURIComponent(nextCursor)}`,
+        { method: "GET", credentials: "include" }
+      );
+
+      if (!response.ok) {
+        throw new Error(`Failed to fetch: ${response.status}`);
+      }
+
+      const page = await response.json();
+      setConversations((prev) => {
+        const seen = new Set(prev.map((conv) => conv.id));
+        return [...prev, ...page.conversations.filter((conv) => !seen.has(conv.id))];
+      });
+      setNextCursor(page.next_cursor);
+    } catch (error) {
+      console.error("Failed to fetch older conversations:", error);
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
+
   const openConversation = (conversation) => {
     setSelectedConversation(conversation);
     setIsModalOpen(true);
@@ -426,6 +467,9 @@ function DirectMessagesPage() {
         <ConversationsList
           conversations={conversations}
           openConversation={openConversation}
+          hasMore={Boolean(nextCursor)}
+          isLoadingMore={isLoadingMore}
+          loadMore={loadMoreConversations}
         />
       </div>
 
@@ -2,6 +2,12 @@ import { useEffect, useState, useRef } from "react";
 import socket from "../../socket.js";
 import { NavLink } from "react-router-dom";
 
+// The lounge shows the latest messages, requested with join_room
+const LOUNGE_BACKFILL = 100;
+
+// A message's identity: its uuid, which write-behind broadcasts carry before the row has an id
+const messageKey = (msg) => msg.uuid ?? msg.seq ?? msg.id;
+
 const TheLounge = () => {
   const [message, setMessage] = useState("");
   const [messages, setMessages] = useState([]);
@@ -10,6 +16,8 @@ const TheLounge = () => {
   const [userId, setUserId] = useState(null);
   const [isLoggedIn, setIsLoggedIn] = useState(false);
   const messagesEndRef = useRef(null);
+  // Newest sequence number held, sent on (re)join so the server replays only what was missed
+  const lastSeq = useRef(null);
 
   useEffect(() => {
     // Fetch current user info
@@ -22,10 +30,8 @@ const TheLounge = () => {
         const userData = await response.json();
         setUsername(userData.username);
         setUserId(userData.id);
+        // Existing messages arrive with the join_room acknowledgement
         setIsLoggedIn(true);
-
-        // Fetch existing messages
-        await fetchMessages();
       } catch (err) {
         setError("Please log in to access the Lounge.");
         setIsLoggedIn(false);
@@ -57,16 +63,43 @@ const TheLounge = () => {
   useEffect(() => {
     if (!isLoggedIn) return;
 
-    // Listen for new messages
+    // Join the lounge room (and rejoin after reconnects) so messages are delivered here.
+    // The first join returns the latest messages in its ack; rejoins replay only what was missed.
+    const joinRoom = () => {
+      const resume =
+        lastSeq.current != null ? { last_seq: lastSeq.current } : { backfill: LOUNGE_BACKFILL };
+      socket.emit("join_room", { event_id: "lounge", username, ...resume }, (ack) => {
+        if (!ack) return;
+        if (ack.messages) setMessages(ack.messages);
+        // Too much was missed to replay; reload the history instead
+        if (ack.complete === false) fetchMessages();
+      });
+    };
+    joinRoom();
+    socket.on("connect", joinRoom);
+
+    // Listen for new (and replayed) messages
     socket.on("receive_lounge_message", (newMessage) => {
-      setMessages((prevMessages) => [...prevMessages, newMessage]);
+      setMessages((prevMessages) => {
+        const key = messageKey(newMessage);
+        return key != null && prevMessages.some((msg) => messageKey(msg) === key)
+          ? prevMessages
+          : [...prevMessages, newMessage];
+      });
     });
 
     // Cleanup when component unmounts
     return () => {
       socket.off("receive_lounge_message");
+      socket.off("connect", joinRoom);
+      socket.emit("leave_room", { event_id: "lounge", username });
     };
-  }, [isLoggedIn]);
+  }, [isLoggedIn, username]);
+
+  useEffect(() => {
+    const seqs = messages.map((msg) => msg.seq ?? msg.id).filter((seq) => seq != null);
+    lastSeq.current = seqs.length ? Math.max(...seqs) : null;
+  }, [messages]);
 
   // Auto-scroll to bottom when new messages arrive
   useEffect(() => {
@@ -116,7 +149,7 @@ const TheLounge = () => {
           {messages.length > 0 ? (
             messages.map((msg, index) => (
               <div
-                key={msg.id || index}
+                key={messageKey(msg) ?? index}
                 className={`message ${msg.username === username ? "my-message" : "other-message"
                   }`}
               >
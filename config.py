@@ -21,6 +21,41 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', os.path.join(BASE_DIR, 'uploads'))
     JSON_COMPACT = False
+
+    # Opt-in write-behind (group commit) for socket chat messages
+    CHAT_WRITE_BEHIND = os.environ.get('CHAT_WRITE_BEHIND', 'false').lower() == 'true'
+    CHAT_FLUSH_BATCH_SIZE = int(os.environ.get('CHAT_FLUSH_BATCH_SIZE', 100))
+    CHAT_FLUSH_INTERVAL = float(os.environ.get('CHAT_FLUSH_INTERVAL', 0.5))
+
+    # Socket.IO message queue shared by all workers, e.g. redis://localhost:6379/0.
+    # memory:// uses an in-process stand-in for tests; unset means a single worker.
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+    SOCKETIO_CHANNEL = os.environ.get('SOCKETIO_CHANNEL', 'flask-socketio')
+    # Recent chat messages kept in memory per room for latest-N reads and reconnect replay (0 = always read the database)
+    CHAT_REPLAY_BUFFER_SIZE = int(os.environ.get('CHAT_REPLAY_BUFFER_SIZE', 200))
+    # Rooms whose recent messages are kept in memory, least recently used evicted first
+    CHAT_REPLAY_MAX_ROOMS = int(os.environ.get('CHAT_REPLAY_MAX_ROOMS', 1000))
+
+    # Seconds to share users' block sets across requests in this process (0 = per request only)
+    BLOCK_CACHE_TTL = float(os.environ.get('BLOCK_CACHE_TTL', 0))
+
+    # Per-request/per-socket-event SQL counters; a statement repeated this many times
+    # in one request is logged as a suspected N+1 (debug mode also adds X-SQL-* headers)
+    SQL_STATS = os.environ.get('SQL_STATS', 'true').lower() == 'true'
+    SQL_N_PLUS_ONE_THRESHOLD = int(os.environ.get('SQL_N_PLUS_ONE_THRESHOLD', 10))
+    SQL_STATS_LOG_ALL = os.environ.get('SQL_STATS_LOG_ALL', 'false').lower() == 'true'
+
+    # Request/event latency, socket, pool and import metrics served at /api/_metrics
+    METRICS = os.environ.get('METRICS', 'true').lower() == 'true'
+
+    # Background EDMTrain import: "background" or "off" (no upstream calls at all)
+    EVENT_IMPORT_MODE = os.environ.get('EVENT_IMPORT_MODE', 'background')
+    # Seconds between scheduled imports; 0 only imports when requested
+    EVENT_IMPORT_INTERVAL = float(os.environ.get('EVENT_IMPORT_INTERVAL', 6 * 60 * 60))
+    # Whether this process runs the timer and the queued jobs; with several workers set it
+    # on exactly one of them (the others only queue jobs), checking every POLL_INTERVAL seconds
+    EVENT_IMPORT_SCHEDULER = os.environ.get('EVENT_IMPORT_SCHEDULER', 'true').lower() == 'true'
+    EVENT_IMPORT_POLL_INTERVAL = float(os.environ.get('EVENT_IMPORT_POLL_INTERVAL', 5))
     
     @staticmethod
     def create_upload_folder():
@@ -0,0 +1,28 @@
+"""add conversation updated at
+
+Revision ID: 0a7d3c58b6e1
+Revises: f19c07a4e2d8
+Create Date: 2026-10-18 17:08:52.640119
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0a7d3c58b6e1'
+down_revision = 'f19c07a4e2d8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('conversations', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+    op.execute("UPDATE conversations SET updated_at = last_timestamp")
+
+
+def downgrade():
+    with op.batch_alter_table('conversations', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,27 @@
+"""add chat message uuid
+
+Revision ID: 2d8b5f3e9a61
+Revises: 9c4d7e1a2b58
+Create Date: 2026-10-18 20:41:05.127733
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2d8b5f3e9a61'
+down_revision = '9c4d7e1a2b58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows keep a NULL uuid; clients fall back to the id for those
+    with op.batch_alter_table('chat_message', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('uuid', sa.String(length=36), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('chat_message', schema=None) as batch_op:
+        batch_op.drop_column('uuid')
@@ -0,0 +1,75 @@
+"""add typed event date
+
+Revision ID: 3c9e7f21ab54
+Revises: 50abf457b65e
+Create Date: 2026-10-18 09:12:41.503118
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c9e7f21ab54'
+down_revision = '50abf457b65e'
+branch_labels = None
+depends_on = None
+
+# Kept local so the migration does not depend on the current models
+EVENT_DATE_FORMATS = ('%Y-%m-%d', '%m/%d/%Y', '%B %d, %Y', '%b %d, %Y')
+BATCH_SIZE = 1000
+
+
+def parse_event_date(value):
+    if not value:
+        return None
+    value = value.strip()
+    for fmt in EVENT_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    try:
+        return datetime.fromisoformat(value).date()
+    except ValueError:
+        return None
+
+
+def upgrade():
+    with op.batch_alter_table('events_table', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('starts_on', sa.Date(), nullable=True))
+        batch_op.create_index('ix_events_table_starts_on_id', ['starts_on', 'id'], unique=False)
+        batch_op.create_index('ix_events_table_city_starts_on_id', ['city', 'starts_on', 'id'], unique=False)
+
+    # Backfill starts_on from the existing free-form date strings
+    events = sa.table(
+        'events_table',
+        sa.column('id', sa.Integer),
+        sa.column('date', sa.String),
+        sa.column('starts_on', sa.Date)
+    )
+    conn = op.get_bind()
+    update = events.update() \
+        .where(events.c.id == sa.bindparam('_id')) \
+        .values(starts_on=sa.bindparam('_starts_on'))
+
+    batch = []
+    for event_id, raw_date in conn.execute(sa.select(events.c.id, events.c.date)).fetchall():
+        starts_on = parse_event_date(raw_date)
+        if starts_on is None:
+            continue
+        batch.append({'_id': event_id, '_starts_on': starts_on})
+        if len(batch) >= BATCH_SIZE:
+            conn.execute(update, batch)
+            batch = []
+    if batch:
+        conn.execute(update, batch)
+
+
+def downgrade():
+    with op.batch_alter_table('events_table', schema=None) as batch_op:
+        batch_op.drop_index('ix_events_table_city_starts_on_id')
+        batch_op.drop_index('ix_events_table_starts_on_id')
+        batch_op.drop_column('starts_on')
@@ -0,0 +1,32 @@
+"""add id to conversation indexes
+
+Revision ID: 6e2f0b9a4c17
+Revises: 0a7d3c58b6e1
+Create Date: 2026-10-18 19:42:10.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6e2f0b9a4c17'
+down_revision = '0a7d3c58b6e1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('conversations', schema=None) as batch_op:
+        batch_op.drop_index('ix_conversations_user_b_id_last_timestamp')
+        batch_op.drop_index('ix_conversations_user_a_id_last_timestamp')
+        batch_op.create_index('ix_conversations_user_a_id_last_timestamp', ['user_a_id', 'last_timestamp', 'id'], unique=False)
+        batch_op.create_index('ix_conversations_user_b_id_last_timestamp', ['user_b_id', 'last_timestamp', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('conversations', schema=None) as batch_op:
+        batch_op.drop_index('ix_conversations_user_b_id_last_timestamp')
+        batch_op.drop_index('ix_conversations_user_a_id_last_timestamp')
+        batch_op.create_index('ix_conversations_user_a_id_last_timestamp', ['user_a_id', 'last_timestamp'], unique=False)
+        batch_op.create_index('ix_conversations_user_b_id_last_timestamp', ['user_b_id', 'last_timestamp'], unique=False)
@@ -0,0 +1,38 @@
+"""add hot path indexes
+
+Revision ID: 8f4a2d6c0e13
+Revises: 3c9e7f21ab54
+Create Date: 2026-10-18 10:03:27.881642
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f4a2d6c0e13'
+down_revision = '3c9e7f21ab54'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_direct_messages_sender_receiver_timestamp', 'direct_messages', ['sender_id', 'receiver_id', 'timestamp'], unique=False)
+    op.create_index('ix_direct_messages_receiver_is_read', 'direct_messages', ['receiver_id', 'is_read', 'sender_id'], unique=False)
+    op.create_index('ix_chat_message_event_id_id', 'chat_message', ['event_id', 'id'], unique=False)
+    op.create_index('ix_user_blocks_blocked_id_blocker_id', 'user_blocks', ['blocked_id', 'blocker_id'], unique=False)
+    op.create_index('ix_user_event_event_id_user_id', 'user_event', ['event_id', 'user_id'], unique=False)
+    op.create_index('ix_friend_association_friend_id_user_id', 'friend_association', ['friend_id', 'user_id'], unique=False)
+    op.create_index('ix_friend_requests_sender_id_receiver_id', 'friend_requests', ['sender_id', 'receiver_id'], unique=False)
+    op.create_index('ix_friend_requests_receiver_id_sender_id', 'friend_requests', ['receiver_id', 'sender_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_friend_requests_receiver_id_sender_id', table_name='friend_requests')
+    op.drop_index('ix_friend_requests_sender_id_receiver_id', table_name='friend_requests')
+    op.drop_index('ix_friend_association_friend_id_user_id', table_name='friend_association')
+    op.drop_index('ix_user_event_event_id_user_id', table_name='user_event')
+    op.drop_index('ix_user_blocks_blocked_id_blocker_id', table_name='user_blocks')
+    op.drop_index('ix_chat_message_event_id_id', table_name='chat_message')
+    op.drop_index('ix_direct_messages_receiver_is_read', table_name='direct_messages')
+    op.drop_index('ix_direct_messages_sender_receiver_timestamp', table_name='direct_messages')
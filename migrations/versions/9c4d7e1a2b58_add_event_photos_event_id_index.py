@@ -0,0 +1,24 @@
+"""add event photos event id index
+
+Revision ID: 9c4d7e1a2b58
+Revises: 6e2f0b9a4c17
+Create Date: 2026-10-18 20:15:37.904416
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c4d7e1a2b58'
+down_revision = '6e2f0b9a4c17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_event_photos_event_id', 'event_photos', ['event_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_event_photos_event_id', table_name='event_photos')
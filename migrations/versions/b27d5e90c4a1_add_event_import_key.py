@@ -0,0 +1,33 @@
+"""add event import key
+
+Revision ID: b27d5e90c4a1
+Revises: 8f4a2d6c0e13
+Create Date: 2026-10-18 11:26:54.310297
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b27d5e90c4a1'
+down_revision = '8f4a2d6c0e13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Event.source was added to the model without a migration; create it where it is missing
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('events_table')}
+
+    with op.batch_alter_table('events_table', schema=None) as batch_op:
+        if 'source' not in columns:
+            batch_op.add_column(sa.Column('source', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('external_id', sa.String(length=255), nullable=True))
+        batch_op.create_unique_constraint('uq_events_table_source_external_id', ['source', 'external_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('events_table', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_events_table_source_external_id', type_='unique')
+        batch_op.drop_column('external_id')
@@ -0,0 +1,27 @@
+"""add direct message uuid
+
+Revision ID: c7a1e4f08d92
+Revises: 2d8b5f3e9a61
+Create Date: 2026-10-18 21:03:48.550192
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7a1e4f08d92'
+down_revision = '2d8b5f3e9a61'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows keep a NULL uuid; clients fall back to the id for those
+    with op.batch_alter_table('direct_messages', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('uuid', sa.String(length=36), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('direct_messages', schema=None) as batch_op:
+        batch_op.drop_column('uuid')
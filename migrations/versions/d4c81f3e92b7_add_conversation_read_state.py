@@ -0,0 +1,80 @@
+"""add conversation read state
+
+Revision ID: d4c81f3e92b7
+Revises: b27d5e90c4a1
+Create Date: 2026-10-18 14:02:37.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4c81f3e92b7'
+down_revision = 'b27d5e90c4a1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('conversations',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_a_id', sa.Integer(), nullable=False),
+    sa.Column('user_b_id', sa.Integer(), nullable=False),
+    sa.Column('user_a_last_read_message_id', sa.Integer(), nullable=True),
+    sa.Column('user_b_last_read_message_id', sa.Integer(), nullable=True),
+    sa.Column('user_a_unread_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('user_b_unread_count', sa.Integer(), server_default='0', nullable=False),
+    sa.CheckConstraint('user_a_id < user_b_id', name='ordered_conversation_pair'),
+    sa.ForeignKeyConstraint(['user_a_id'], ['users_table.id'], ),
+    sa.ForeignKeyConstraint(['user_b_id'], ['users_table.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_a_id', 'user_b_id', name='unique_conversation_pair')
+    )
+    op.create_index('ix_conversations_user_b_id', 'conversations', ['user_b_id'], unique=False)
+
+    with op.batch_alter_table('users_table', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('unread_message_count', sa.Integer(), server_default='0', nullable=False))
+
+    # Backfill one row per existing pair, with each side's counter and watermark taken from is_read
+    op.execute("""
+        INSERT INTO conversations (
+            user_a_id, user_b_id,
+            user_a_last_read_message_id, user_b_last_read_message_id,
+            user_a_unread_count, user_b_unread_count
+        )
+        SELECT
+            pair.user_a_id,
+            pair.user_b_id,
+            MAX(CASE WHEN pair.receiver_id = pair.user_a_id AND pair.is_read THEN pair.id END),
+            MAX(CASE WHEN pair.receiver_id = pair.user_b_id AND pair.is_read THEN pair.id END),
+            SUM(CASE WHEN pair.receiver_id = pair.user_a_id AND NOT pair.is_read THEN 1 ELSE 0 END),
+            SUM(CASE WHEN pair.receiver_id = pair.user_b_id AND NOT pair.is_read THEN 1 ELSE 0 END)
+        FROM (
+            SELECT
+                id,
+                receiver_id,
+                is_read,
+                CASE WHEN sender_id < receiver_id THEN sender_id ELSE receiver_id END AS user_a_id,
+                CASE WHEN sender_id < receiver_id THEN receiver_id ELSE sender_id END AS user_b_id
+            FROM direct_messages
+            WHERE sender_id <> receiver_id
+        ) AS pair
+        GROUP BY pair.user_a_id, pair.user_b_id
+    """)
+    op.execute("""
+        UPDATE users_table SET unread_message_count = (
+            SELECT COUNT(*) FROM direct_messages
+            WHERE direct_messages.receiver_id = users_table.id
+              AND direct_messages.sender_id <> direct_messages.receiver_id
+              AND NOT direct_messages.is_read
+        )
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('users_table', schema=None) as batch_op:
+        batch_op.drop_column('unread_message_count')
+
+    op.drop_index('ix_conversations_user_b_id', table_name='conversations')
+    op.drop_table('conversations')
@@ -0,0 +1,44 @@
+"""add direct message conversation id
+
+Revision ID: e6a2b9d17f40
+Revises: d4c81f3e92b7
+Create Date: 2026-10-18 15:11:48.902631
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6a2b9d17f40'
+down_revision = 'd4c81f3e92b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('direct_messages', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('conversation_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_direct_messages_conversation_id_conversations', 'conversations', ['conversation_id'], ['id'])
+
+    # Every pair with messages already has a conversation row (added with the read state)
+    op.execute("""
+        UPDATE direct_messages SET conversation_id = (
+            SELECT conversations.id FROM conversations
+            WHERE conversations.user_a_id = CASE WHEN direct_messages.sender_id < direct_messages.receiver_id
+                                                 THEN direct_messages.sender_id ELSE direct_messages.receiver_id END
+              AND conversations.user_b_id = CASE WHEN direct_messages.sender_id < direct_messages.receiver_id
+                                                 THEN direct_messages.receiver_id ELSE direct_messages.sender_id END
+        )
+        WHERE direct_messages.sender_id <> direct_messages.receiver_id
+    """)
+
+    op.create_index('ix_direct_messages_conversation_id_id', 'direct_messages', ['conversation_id', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_direct_messages_conversation_id_id', table_name='direct_messages')
+
+    with op.batch_alter_table('direct_messages', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_direct_messages_conversation_id_conversations', type_='foreignkey')
+        batch_op.drop_column('conversation_id')
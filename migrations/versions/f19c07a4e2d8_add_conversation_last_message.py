@@ -0,0 +1,48 @@
+"""add conversation last message
+
+Revision ID: f19c07a4e2d8
+Revises: e6a2b9d17f40
+Create Date: 2026-10-18 16:24:09.337140
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f19c07a4e2d8'
+down_revision = 'e6a2b9d17f40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('conversations', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('last_message_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('last_timestamp', sa.DateTime(), nullable=True))
+        batch_op.drop_index('ix_conversations_user_b_id')
+        batch_op.create_index('ix_conversations_user_a_id_last_timestamp', ['user_a_id', 'last_timestamp'], unique=False)
+        batch_op.create_index('ix_conversations_user_b_id_last_timestamp', ['user_b_id', 'last_timestamp'], unique=False)
+
+    # The newest message of each conversation is the end of its (conversation_id, id) range
+    op.execute("""
+        UPDATE conversations SET last_message_id = (
+            SELECT MAX(direct_messages.id) FROM direct_messages
+            WHERE direct_messages.conversation_id = conversations.id
+        )
+    """)
+    op.execute("""
+        UPDATE conversations SET last_timestamp = (
+            SELECT direct_messages.timestamp FROM direct_messages
+            WHERE direct_messages.id = conversations.last_message_id
+        )
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('conversations', schema=None) as batch_op:
+        batch_op.drop_index('ix_conversations_user_b_id_last_timestamp')
+        batch_op.drop_index('ix_conversations_user_a_id_last_timestamp')
+        batch_op.create_index('ix_conversations_user_b_id', ['user_b_id'], unique=False)
+        batch_op.drop_column('last_timestamp')
+        batch_op.drop_column('last_message_id')
@@ -118,7 +118,8 @@ def seed_data():
     print("Database cleared.")
 
     print("Fetching and Seeding Events...")
-    fetch_and_add_events()  # Now works without needing a new transaction
+    # The events table was just cleared, so import cached responses even if they are unchanged
+    fetch_and_add_events(skip_unchanged=False)
 
     print("Fetching Existing Events...")
     events = Event.query.all()
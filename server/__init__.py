@@ -1,13 +1,38 @@
 from flask import Flask, request
 from flask_socketio import SocketIO, join_room, leave_room, send
 from server.extensions import db, bcrypt, migrate, cors
+from server.socket_queue import message_queue_options
+from server.chat_history import room_history
+from server.socket_identity import socket_identities
+from server.sql_stats import sql_stats
+from server.metrics import metrics, socketio_collector
+from server.models import Event
+from server.pagination import parse_limit
 from config import Config
-from server.models import ChatMessage
 from datetime import datetime
 
 # Initialize SocketIO with CORS allowed
 socketio = SocketIO(cors_allowed_origins="*")
 
+# Lounge messages are stored and broadcast like an event chat with this id
+LOUNGE_ROOM_ID = "lounge"
+# How many of the latest lounge messages the lounge page loads
+LOUNGE_HISTORY_SIZE = 100
+
+def chat_room(event_id):
+    """Socket.IO room that receives an event's (or the lounge's) chat messages"""
+    return f"event_{event_id}"
+
+def chat_event(event_id):
+    """Socket.IO event name clients listen on for a room's chat messages"""
+    if event_id == LOUNGE_ROOM_ID:
+        return "receive_lounge_message"
+    return f"receive_message_{event_id}"
+
+def user_room(user_id):
+    """Socket.IO room shared by all of a user's connected devices"""
+    return f"user_{user_id}"
+
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
@@ -17,7 +42,12 @@ def create_app():
     bcrypt.init_app(app)
     migrate.init_app(app, db)
     cors.init_app(app, supports_credentials=True)
-    socketio.init_app(app)
+    # A shared message queue lets several workers deliver to each other's rooms
+    socketio.init_app(app, **message_queue_options(app.config))
+    room_history.init_app(app)
+    sql_stats.init_app(app)
+    metrics.init_app(app)
+    metrics.add_collector(socketio_collector(socketio, socket_identities))
 
     # Register SocketIO events
     register_socketio_events()
@@ -36,8 +66,37 @@ def register_socketio_events():
             send({"error": "Event ID is required"}, to=request.sid)
             return
 
-        room = f"event_{event_id}"
+        # A reconnecting client sends the last sequence number it saw and gets only the gap;
+        # a client opening the chat asks for the latest `backfill` messages in the ack instead
+        last_seq = data.get("last_seq")
+        backfill = data.get("backfill")
+        try:
+            last_seq = int(last_seq) if last_seq is not None else None
+            backfill = parse_limit(backfill) if backfill is not None else None
+        except (TypeError, ValueError):
+            return {"error": "last_seq and backfill must be integers"}
+
+        # Check the event once here, so sending to the room needs no lookup
+        if event_id != LOUNGE_ROOM_ID and db.session.query(Event.id).filter(Event.id == event_id).scalar() is None:
+            return {"error": "Event not found"}
+
+        room = chat_room(event_id)
         join_room(room)
+        identity = socket_identities.get(request.sid)
+        if identity:
+            identity.rooms.add(room)
+
+        ack = {}
+        if backfill is not None:
+            messages, has_more = room_history.latest(room, event_id, backfill)
+            ack.update(messages=messages, has_more=has_more)
+        if last_seq is not None:
+            missed, complete = room_history.replay(room, event_id, last_seq)
+            for payload in missed:
+                socketio.emit(chat_event(event_id), payload, to=request.sid)
+            # complete is False when the gap was too large to replay; reload the history instead
+            ack.update(replayed=len(missed), complete=complete)
+
         send(
             {
                 "message": f"{username} has joined the chat",
@@ -46,6 +105,7 @@ def register_socketio_events():
             },
             to=room,
         )
+        return ack
 
     @socketio.on("leave_room")
     def handle_leave(data):
@@ -56,8 +116,11 @@ def register_socketio_events():
             send({"error": "Event ID is required"}, to=request.sid)
             return
 
-        room = f"event_{event_id}"
+        room = chat_room(event_id)
         leave_room(room)
+        identity = socket_identities.get(request.sid)
+        if identity:
+            identity.rooms.discard(room)
         send(
             {
                 "message": f"{username} has left the chat",
@@ -66,37 +129,3 @@ def register_socketio_events():
             },
             to=room,
         )
-
-    @socketio.on("send_message")
-    def handle_message(data):
-        username = data.get("username")
-        message = data.get("message")
-        event_id = data.get("event_id")
-
-        if not event_id or not message:
-            send({"error": "Event ID and message are required"}, to=request.sid)
-            return
-
-        try:
-            new_message = ChatMessage(
-                event_id=event_id,
-                username=username,
-                message=message,
-                timestamp=datetime.utcnow(),
-            )
-            db.session.add(new_message)
-            db.session.commit()
-
-            room = f"event_{event_id}"
-            socketio.emit(
-                "receive_message",
-                {
-                    "username": username,
-                    "message": message,
-                    "timestamp": new_message.timestamp.isoformat(),
-                },
-                to=room,
-            )
-        except Exception as e:
-            db.session.rollback()
-            send({"error": str(e)}, to=request.sid)
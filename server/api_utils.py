@@ -1,7 +1,14 @@
 import requests
+import json
 import os
-from server.models import Event
-from server.extensions import db
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from server.models import Event, parse_event_date
+from server.extensions import db, dialect_insert
+from server.http_cache import HttpCache, CachedResponse
+from server.metrics import metrics, http_cache_collector
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
@@ -11,32 +18,114 @@ EDMTRAIN_API_KEY = os.getenv("EDMTRAIN_API_KEY")
 EDMTRAIN_LOCATION_API_URL = os.getenv("EDMTRAIN_LOCATION_API_URL")
 EDMTRAIN_EVENTS_API_URL = os.getenv("EDMTRAIN_EVENTS_API_URL")
 
-def get_nyc_location_ids():    
+# Metro areas to import, as "City, State" entries separated by semicolons
+EDMTRAIN_LOCATIONS_SETTING = os.getenv("EDMTRAIN_LOCATIONS", "New York, New York")
+# Concurrent location fetches, which is also the HTTP connection pool size
+EDMTRAIN_MAX_WORKERS = int(os.getenv("EDMTRAIN_MAX_WORKERS", 4))
+# Per-request timeout in seconds, and retries with exponential backoff on transient errors
+EDMTRAIN_TIMEOUT = float(os.getenv("EDMTRAIN_TIMEOUT", 10))
+EDMTRAIN_RETRIES = int(os.getenv("EDMTRAIN_RETRIES", 3))
+EDMTRAIN_BACKOFF = float(os.getenv("EDMTRAIN_BACKOFF", 0.5))
+# On-disk response cache: directory ("" disables it), seconds to trust an entry before
+# revalidating, and an offline switch that serves cached responses without any requests
+EDMTRAIN_CACHE_DIR = os.getenv(
+    "EDMTRAIN_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "instance", "http_cache")
+)
+EDMTRAIN_CACHE_TTL = float(os.getenv("EDMTRAIN_CACHE_TTL", 15 * 60))
+EDMTRAIN_CACHE_OFFLINE = os.getenv("EDMTRAIN_CACHE_OFFLINE", "false").lower() == "true"
+
+# Rows per INSERT ... ON CONFLICT statement during imports
+IMPORT_CHUNK_SIZE = 500
+# Upstream fields refreshed when an imported event already exists
+UPSERT_COLUMNS = ("name", "date", "starts_on", "venue_name", "city", "photo")
+
+# Events returned by EDMTrain ("fetched") and written to the events table ("upserted")
+IMPORT_ROWS = metrics.counter("edmtrain_import_rows_total", "EDMTrain events handled by imports", ["stage"])
+LAST_IMPORT_ROWS = metrics.gauge("edmtrain_import_last_rows", "Events upserted by the most recent EDMTrain import")
+
+def parse_locations(value):
+    """Parse "City, State; City, State" into a list of (city, state) pairs"""
+    locations = []
+    for entry in value.split(";"):
+        if not entry.strip():
+            continue
+        city, _, state = entry.partition(",")
+        locations.append((city.strip(), state.strip() or city.strip()))
+    return locations
+
+EDMTRAIN_LOCATIONS = parse_locations(EDMTRAIN_LOCATIONS_SETTING)
+
+def build_http_session(pool_size=EDMTRAIN_MAX_WORKERS, retries=EDMTRAIN_RETRIES):
+    """A keep-alive session shared by the import workers, retrying transient upstream errors"""
+    retry = Retry(
+        total=retries,
+        backoff_factor=EDMTRAIN_BACKOFF,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET",)
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    http = requests.Session()
+    http.mount("http://", adapter)
+    http.mount("https://", adapter)
+    return http
+
+http_session = build_http_session()
+
+http_cache = HttpCache(EDMTRAIN_CACHE_DIR, EDMTRAIN_CACHE_TTL, offline=EDMTRAIN_CACHE_OFFLINE) if EDMTRAIN_CACHE_DIR else None
+if http_cache:
+    metrics.add_collector(http_cache_collector(http_cache))
+
+def upstream_get(url, params, http=None):
+    """GET through the response cache when it is enabled; returns a CachedResponse"""
+    http = http or http_session
+    if http_cache:
+        return http_cache.get(http, url, params=params, timeout=EDMTRAIN_TIMEOUT)
+    response = http.get(url, params=params, timeout=EDMTRAIN_TIMEOUT)
+    return CachedResponse(response.status_code, response.content, True, None)
+
+def mark_imported(responses):
+    """Tell the cache these responses are stored, so unchanged copies are skipped next time"""
+    if http_cache:
+        for response in responses:
+            http_cache.mark_seen(response)
+
+def get_location_ids(city, state, http=None):
     params = {
-        "state": "New York",
-        "city": "New York",
+        "state": state,
+        "city": city,
         "client": EDMTRAIN_API_KEY
     }
     
-    response = requests.get(EDMTRAIN_LOCATION_API_URL, params=params)
+    response = upstream_get(EDMTRAIN_LOCATION_API_URL, params, http=http)
     
-    if response.status_code != 200:
-        print(f"Error: Received status code {response.status_code} from API.")
+    if response.status != 200:
+        print(f"Error: Received status code {response.status} from API.")
         return []
 
     try:
-        location_data = response.json()
+        location_data = json.loads(response.body)
         location_ids = [location['id'] for location in location_data['data']]
         return location_ids
-    except requests.exceptions.JSONDecodeError:
-        print(f"Error: Failed to decode JSON from response: {response.text}")
+    except ValueError:
+        print(f"Error: Failed to decode JSON from response: {response.body[:200]}")
         return []
 
-def fetch_and_add_edmtrain_events():
-    location_ids = get_nyc_location_ids()
+def get_nyc_location_ids():
+    return get_location_ids("New York", "New York")
+
+def fetch_location_events(city, state, http=None, skip_unchanged=True):
+    """Fetch the raw EDMTrain events for one configured location.
+
+    Returns (events, response). With skip_unchanged, a response identical
+    to the last one imported (see mark_imported) returns no events without
+    being parsed at all. The response is None when there is nothing to
+    mark as imported.
+    """
+    location_ids = get_location_ids(city, state, http=http)
     if not location_ids:
-        print("No location IDs found for NYC.")
-        return
+        print(f"No location IDs found for {city}, {state}.")
+        return [], None
 
     location_id_string = ",".join(map(str, location_ids))
 
@@ -45,30 +134,138 @@ def fetch_and_add_edmtrain_events():
         "locationIds": location_id_string
     }
 
-    response = requests.get(EDMTRAIN_EVENTS_API_URL, params=params)
+    response = upstream_get(EDMTRAIN_EVENTS_API_URL, params, http=http)
     
-    if response.status_code != 200:
-        print(f"Error: Received status code {response.status_code} from API.")
-        return
+    if response.status != 200:
+        print(f"Error: Received status code {response.status} from API.")
+        return [], None
+    if skip_unchanged and not response.changed:
+        print(f"EDMTrain events for {city}, {state} unchanged since the last import.")
+        return [], None
 
     try:
-        events_data = response.json()
+        events_data = json.loads(response.body)
         if not events_data or 'data' not in events_data:
-            print("No events found.")
-            return
-    except requests.exceptions.JSONDecodeError:
-        print(f"Error: Failed to decode JSON from response: {response.text}")
-        return
+            print(f"No events found for {city}, {state}.")
+            return [], None
+    except ValueError:
+        print(f"Error: Failed to decode JSON from response: {response.body[:200]}")
+        return [], None
 
-    existing_events = {(event.name, event.date) for event in Event.query.all()}  # Get existing event (name, date) pairs
+    return events_data['data'], response
 
-    new_events = []
-    for event in events_data['data']:
+def fetch_all_location_events(locations=None, max_workers=EDMTRAIN_MAX_WORKERS, http=None, skip_unchanged=True):
+    """Fetch every location concurrently on a bounded pool; a failed location is skipped.
+
+    Returns (events, responses), the responses to mark as imported once the events are stored.
+    """
+    locations = locations if locations is not None else EDMTRAIN_LOCATIONS
+    events = []
+    responses = []
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(fetch_location_events, city, state, http, skip_unchanged): (city, state)
+            for city, state in locations
+        }
+        for future in as_completed(futures):
+            city, state = futures[future]
+            try:
+                location_events, response = future.result()
+            except requests.exceptions.RequestException as e:
+                print(f"Error fetching EDMTrain events for {city}, {state}: {str(e)}")
+                continue
+            events.extend(location_events)
+            if response is not None:
+                responses.append(response)
+    return events, responses
+
+def event_row(external_id, name, date, venue_name, city, photo, source):
+    """Build a row for upsert_events, normalized the way the Event validators would"""
+    name, venue_name, city = name.strip(), venue_name.strip(), city.strip()
+    if external_id is None:
+        # No upstream id: fall back to a normalized (name, date, venue) key
+        external_id = "|".join(part.lower() for part in (name, date, venue_name))
+    return {
+        "source": source,
+        "external_id": str(external_id),
+        "name": name,
+        "date": date,
+        "starts_on": parse_event_date(date),
+        "venue_name": venue_name,
+        "city": city,
+        "photo": photo,
+    }
+
+def adopt_legacy_events(rows):
+    """Attach external ids to events imported before they were tracked, matched on (name, date)"""
+    source = rows[0]["source"]
+    keys = {(row["name"], row["date"]): row["external_id"] for row in rows}
+    # Ids that are already attached to an event can't be claimed by a second, duplicate row
+    claimed = {
+        external_id for (external_id,) in db.session.query(Event.external_id).filter(
+            Event.source == source,
+            Event.external_id.in_(set(keys.values()))
+        )
+    }
+    legacy = db.session.query(Event.id, Event.name, Event.date).filter(
+        Event.external_id.is_(None),
+        db.or_(Event.source == source, Event.source.is_(None)),
+        Event.name.in_({row["name"] for row in rows})
+    ).all()
+
+    updates = []
+    for event_id, name, date in legacy:
+        external_id = keys.get((name, date))
+        if external_id and external_id not in claimed:
+            claimed.add(external_id)
+            updates.append({"_id": event_id, "_external_id": external_id, "_source": source})
+    if updates:
+        table = Event.__table__
+        db.session.execute(
+            table.update()
+            .where(table.c.id == db.bindparam("_id"))
+            .values(external_id=db.bindparam("_external_id"), source=db.bindparam("_source")),
+            updates
+        )
+
+def upsert_events(rows):
+    """Insert new events and refresh changed upstream fields, keyed on (source, external_id)"""
+    table = Event.__table__
+
+    # The same event can appear twice in one payload; keep the last copy
+    rows = list({(row["source"], row["external_id"]): row for row in rows}.values())
+
+    count = 0
+    for start in range(0, len(rows), IMPORT_CHUNK_SIZE):
+        chunk = rows[start:start + IMPORT_CHUNK_SIZE]
+        adopt_legacy_events(chunk)
+        statement = dialect_insert(table).values(chunk)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.source, table.c.external_id],
+            set_={column: statement.excluded[column] for column in UPSERT_COLUMNS}
+        )
+        db.session.execute(statement)
+        db.session.commit()
+        count += len(chunk)
+    return count
+
+def fetch_and_add_edmtrain_events(locations=None, skip_unchanged=True):
+    started = time.perf_counter()
+    raw_events, responses = fetch_all_location_events(locations, skip_unchanged=skip_unchanged)
+    IMPORT_ROWS.labels("fetched").inc(len(raw_events))
+    LAST_IMPORT_ROWS.labels().set(0)
+    if not raw_events:
+        mark_imported(responses)
+        print("No new or changed EDMTrain events for the configured locations.")
+        return 0
+
+    rows = []
+    for event in raw_events:
         try:
             venue = event.get("venue", {})
             city = venue.get("location", "Unknown City")
-            if not isinstance(city, str) or "NY" not in city:
-                continue  # Skip events not in NYC
+            if not isinstance(city, str) or not city.strip():
+                continue  # Skip events without a usable location
 
             event_name = event.get("name", "Unnamed Event") or "Unnamed Event"
             if event_name == "Unnamed Event":
@@ -79,26 +276,34 @@ def fetch_and_add_edmtrain_events():
 
             photo_url = event.get("photo")  # This can be None
 
-            if (event_name, event_date) not in existing_events:  # Avoid duplicates
-                new_events.append(Event(
-                    name=event_name.strip(),
-                    date=event_date,
-                    venue_name=venue_name.strip(),
-                    city=city.strip(),
-                    photo=photo_url,  # This will be None if not present
-                    source="EDMTrain"  # Adding source identifier
-                ))
+            rows.append(event_row(
+                external_id=event.get("id"),
+                name=event_name,
+                date=event_date,
+                venue_name=venue_name,
+                city=city,
+                photo=photo_url,
+                source="EDMTrain"  # Adding source identifier
+            ))
 
         except Exception as e:
             print(f"Error processing event: {event.get('name', 'Unnamed Event')}. Error: {str(e)}")
             continue
 
-    if new_events:
-        db.session.add_all(new_events)
-        db.session.commit()
-        print(f"{len(new_events)} new EDMTrain events successfully added.")
+    if rows:
+        count = upsert_events(rows)
+        # Only now are the responses stored; if the upsert raised they count as changed next time
+        mark_imported(responses)
+        elapsed = time.perf_counter() - started
+        IMPORT_ROWS.labels("upserted").inc(count)
+        LAST_IMPORT_ROWS.labels().set(count)
+        print(f"{count} EDMTrain events successfully imported or updated in {elapsed:.2f}s "
+              f"({count / elapsed:.0f} events/s).")
+        return count
     else:
+        mark_imported(responses)
         print("No new EDMTrain events to add.")
+        return 0
 
 # def fetch_and_add_eventbrite_events():
 #     # Eventbrite API configuration
@@ -208,7 +413,7 @@ def fetch_and_add_edmtrain_events():
 #     else:
 #         print("No new Eventbrite events to add.")
 
-def fetch_and_add_events():
+def fetch_and_add_events(skip_unchanged=True):
     """Main function to fetch and add events from all sources"""
-    fetch_and_add_edmtrain_events()
+    fetch_and_add_edmtrain_events(skip_unchanged=skip_unchanged)
     # fetch_and_add_eventbrite_events()
\ No newline at end of file
@@ -0,0 +1,62 @@
+import threading
+import time
+from collections import namedtuple
+
+from flask import current_app, g, has_app_context
+
+from server.extensions import db
+from server.models import UserBlock
+
+# Ids a user has blocked, and ids of users who have blocked them
+BlockSet = namedtuple('BlockSet', ['blocked', 'blocked_by'])
+
+# Optional process-wide cache, enabled with a positive BLOCK_CACHE_TTL
+_process_cache = {}
+_process_cache_lock = threading.Lock()
+
+
+def load_block_set(user_id):
+    """Load both directions of a user's blocks with a single query"""
+    rows = db.session.query(UserBlock.blocker_id, UserBlock.blocked_id).filter(
+        (UserBlock.blocker_id == user_id) | (UserBlock.blocked_id == user_id)
+    ).all()
+    blocked = frozenset(blocked_id for blocker_id, blocked_id in rows if blocker_id == user_id)
+    blocked_by = frozenset(blocker_id for blocker_id, blocked_id in rows if blocked_id == user_id)
+    return BlockSet(blocked, blocked_by)
+
+
+def get_block_set(user_id):
+    """Return a user's BlockSet, shared across the current request and optionally the process"""
+    if not has_app_context():
+        return load_block_set(user_id)
+
+    request_cache = g.setdefault('block_sets', {})
+    if user_id in request_cache:
+        return request_cache[user_id]
+
+    ttl = current_app.config.get('BLOCK_CACHE_TTL', 0)
+    block_set = None
+    if ttl > 0:
+        with _process_cache_lock:
+            cached = _process_cache.get(user_id)
+        if cached and cached[0] > time.monotonic():
+            block_set = cached[1]
+
+    if block_set is None:
+        block_set = load_block_set(user_id)
+        if ttl > 0:
+            with _process_cache_lock:
+                _process_cache[user_id] = (time.monotonic() + ttl, block_set)
+
+    request_cache[user_id] = block_set
+    return block_set
+
+
+def invalidate_block_sets(*user_ids):
+    """Drop cached BlockSets after a block between these users is added or removed"""
+    with _process_cache_lock:
+        for user_id in user_ids:
+            _process_cache.pop(user_id, None)
+    if has_app_context() and 'block_sets' in g:
+        for user_id in user_ids:
+            g.block_sets.pop(user_id, None)
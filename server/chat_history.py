@@ -0,0 +1,171 @@
+import threading
+from collections import OrderedDict, deque
+
+from server.extensions import db
+from server.models import ChatMessage
+
+
+def chat_payload(message):
+    """Broadcast payload for a stored chat message (or a row of the columns below)"""
+    return {
+        "id": message.id,
+        "seq": message.id,
+        "uuid": message.uuid,
+        "username": message.username,
+        "message": message.message,
+        "timestamp": message.timestamp.isoformat(),
+    }
+
+
+def _message_columns(event_id):
+    return db.session.query(
+        ChatMessage.id,
+        ChatMessage.uuid,
+        ChatMessage.username,
+        ChatMessage.message,
+        ChatMessage.timestamp
+    ).filter(ChatMessage.event_id == event_id)
+
+
+def load_messages_after(event_id, last_seq, limit):
+    """Up to `limit` stored messages of a room newer than `last_seq`, oldest first"""
+    rows = _message_columns(event_id).filter(
+        ChatMessage.id > last_seq
+    ).order_by(ChatMessage.id).limit(limit).all()
+    return [chat_payload(row) for row in rows]
+
+
+def load_latest_messages(event_id, limit):
+    """The newest `limit` stored messages of a room, oldest first"""
+    rows = _message_columns(event_id).order_by(ChatMessage.id.desc()).limit(limit).all()
+    return [chat_payload(row) for row in reversed(rows)]
+
+
+class RoomBuffer:
+    """The newest messages of one room in seq order; `complete` while it still holds the room's whole history"""
+
+    def __init__(self, payloads, capacity):
+        self.messages = deque(payloads, maxlen=capacity)
+        self.complete = len(payloads) < capacity
+        # Per room, so sends to different rooms never wait on each other
+        self.lock = threading.Lock()
+
+    def append(self, payload):
+        seq = payload["seq"]
+        with self.lock:
+            messages = self.messages
+            if not messages or seq > messages[-1]["seq"]:
+                # The usual case: newer than anything held
+                if len(messages) == messages.maxlen:
+                    self.complete = False
+                messages.append(payload)
+                return
+
+            # A concurrent send that lost the race to append, or a message committed
+            # just before the room was loaded: walk back from the newest to its place
+            position = len(messages)
+            while position and messages[position - 1]["seq"] > seq:
+                position -= 1
+            if position and messages[position - 1]["seq"] == seq:
+                return
+            if len(messages) == messages.maxlen:
+                self.complete = False
+                if position == 0:
+                    return  # Older than the whole window
+                messages.popleft()
+                position -= 1
+            messages.insert(position, payload)
+
+    def snapshot(self):
+        """(payloads oldest first, complete)"""
+        with self.lock:
+            return list(self.messages), self.complete
+
+
+class RoomHistory:
+    """Recent chat payloads per room, kept in memory for latest-N reads and reconnect replay.
+
+    A message's sequence number is its ChatMessage id, which only grows
+    within a room. The first read of a room (or the first message sent to
+    it) loads its newest `capacity` messages from the database; after that
+    the socket send handlers append every broadcast, so latest-N reads and
+    replays of gaps inside the window need no queries. Older gaps are read
+    from the (event_id, id) index. With a Socket.IO message queue other
+    workers broadcast messages this process never sees, and with
+    write-behind the broadcast payloads have no id until their batch is
+    written, so in either case the buffer is disabled and every read goes
+    to the database. At most `max_rooms` rooms are kept, least recently
+    used first out, and rooms without messages (including ids of events
+    that do not exist) are never kept. Each room has its own lock; the
+    shared one only guards the map of rooms.
+    """
+
+    def __init__(self, capacity=200, max_rooms=1000):
+        self.capacity = capacity
+        self.max_rooms = max_rooms
+        self.enabled = True
+        self._rooms = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.capacity = app.config['CHAT_REPLAY_BUFFER_SIZE']
+        self.max_rooms = app.config['CHAT_REPLAY_MAX_ROOMS']
+        self.enabled = (
+            self.capacity > 0
+            and not app.config.get('SOCKETIO_MESSAGE_QUEUE')
+            and not app.config.get('CHAT_WRITE_BEHIND')
+        )
+
+    def append(self, room, event_id, payload):
+        """Remember a payload broadcast to `room`"""
+        if not self.enabled:
+            return
+        self._room(room, event_id, keep_empty=True).append(payload)
+
+    def latest(self, room, event_id, limit):
+        """The newest `limit` payloads of `room`, oldest first, and whether older ones exist"""
+        if not self.enabled or limit > self.capacity:
+            payloads = load_latest_messages(event_id, limit + 1)
+            return payloads[-limit:], len(payloads) > limit
+        payloads, complete = self._room(room, event_id).snapshot()
+        return payloads[-limit:], len(payloads) > limit or not complete
+
+    def replay(self, room, event_id, last_seq, limit=None):
+        """Payloads of `room` with a sequence number above `last_seq`, oldest first.
+
+        Returns (payloads, complete); complete is False when more than
+        `limit` messages were missed and the client should reload instead.
+        """
+        limit = limit or self.capacity or 200
+        payloads, complete = [], False
+        if self.enabled:
+            with self._lock:
+                buffer = self._rooms.get(room)
+            if buffer:
+                payloads, complete = buffer.snapshot()
+        if payloads and (complete or payloads[0]["seq"] <= last_seq):
+            missed = [payload for payload in payloads if payload["seq"] > last_seq]
+        else:
+            missed = load_messages_after(event_id, last_seq, limit + 1)
+        return missed[:limit], len(missed) <= limit
+
+    def _room(self, room, event_id, keep_empty=False):
+        with self._lock:
+            buffer = self._rooms.get(room)
+            if buffer is not None:
+                self._rooms.move_to_end(room)
+                return buffer
+        # Load outside the lock; if another thread got there first its buffer wins
+        loaded = RoomBuffer(load_latest_messages(event_id, self.capacity), self.capacity)
+        if not loaded.messages and not keep_empty:
+            # Reads of empty rooms (or unknown event ids) are not worth a slot
+            return loaded
+        with self._lock:
+            buffer = self._rooms.setdefault(room, loaded)
+            self._rooms.move_to_end(room)
+            while len(self._rooms) > self.max_rooms:
+                self._rooms.popitem(last=False)
+            return buffer
+
+
+room_history = RoomHistory()
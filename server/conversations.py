@@ -0,0 +1,265 @@
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from server.extensions import db, dialect_insert
+from server.models import Conversation, DirectMessage, User, UserBlock
+from server.pagination import decode_cursor, encode_cursor
+
+# How far before a sync cursor to look again, so rows that committed late (slow
+# transactions, write-behind batches) are not skipped; clients de-duplicate by uuid
+SYNC_OVERLAP = timedelta(seconds=30)
+
+
+def conversation_pair(user_id, other_id):
+    """The (user_a_id, user_b_id) key of a conversation, lowest id first"""
+    return (user_id, other_id) if user_id < other_id else (other_id, user_id)
+
+
+def side_columns(user_id, pair):
+    """(last_read_message_id, unread_count) columns for `user_id`'s side of `pair`"""
+    if user_id == pair[0]:
+        return Conversation.user_a_last_read_message_id, Conversation.user_a_unread_count
+    return Conversation.user_b_last_read_message_id, Conversation.user_b_unread_count
+
+
+def ensure_conversation(pair):
+    """Create the conversation row for `pair` if it does not exist yet"""
+    statement = dialect_insert(Conversation.__table__).values(user_a_id=pair[0], user_b_id=pair[1])
+    db.session.execute(statement.on_conflict_do_nothing(index_elements=['user_a_id', 'user_b_id']))
+
+
+def conversation_id_for(user_id, other_id):
+    """Id of the conversation between two users, creating it on first contact"""
+    if user_id == other_id:
+        return None  # Notes to self have no pair to belong to
+    pair = conversation_pair(user_id, other_id)
+    lookup = db.session.query(Conversation.id).filter(
+        Conversation.user_a_id == pair[0],
+        Conversation.user_b_id == pair[1]
+    )
+    conversation_id = lookup.scalar()
+    if conversation_id is None:
+        ensure_conversation(pair)
+        conversation_id = lookup.scalar()
+    return conversation_id
+
+
+def assign_conversations(messages):
+    """Fill in conversation_id on message dicts about to be inserted, one lookup per pair"""
+    ids = {}
+    for message in messages:
+        pair = conversation_pair(message['sender_id'], message['receiver_id'])
+        if pair not in ids:
+            ids[pair] = conversation_id_for(*pair)
+        message['conversation_id'] = ids[pair]
+
+
+def record_direct_messages(messages):
+    """Update conversation summaries for newly stored messages, given as dicts with sender_id, receiver_id and conversation_id.
+
+    Must run after the INSERT of the messages, in the same transaction.
+    Issues one UPDATE per conversation (and per receiver), not per message.
+    """
+    counts = Counter(
+        (message['conversation_id'], message['sender_id'], message['receiver_id'])
+        for message in messages
+        if message['conversation_id'] is not None
+    )
+    received = Counter()
+    for (conversation_id, sender_id, receiver_id), count in counts.items():
+        _, unread_column = side_columns(receiver_id, conversation_pair(sender_id, receiver_id))
+        # The newest stored message is the end of the conversation's (conversation_id, id) range
+        newest_id = db.session.query(db.func.max(DirectMessage.id)).filter(
+            DirectMessage.conversation_id == conversation_id
+        ).scalar_subquery()
+        newest_timestamp = db.session.query(DirectMessage.timestamp).filter(
+            DirectMessage.id == newest_id
+        ).scalar_subquery()
+        # Never move backwards if a concurrent sender already recorded a newer message
+        advances = Conversation.last_message_id.is_(None) | (Conversation.last_message_id < newest_id)
+        db.session.query(Conversation).filter(
+            Conversation.id == conversation_id
+        ).update({
+            unread_column: unread_column + count,
+            Conversation.last_message_id: db.case((advances, newest_id), else_=Conversation.last_message_id),
+            Conversation.last_timestamp: db.case((advances, newest_timestamp), else_=Conversation.last_timestamp),
+            Conversation.updated_at: datetime.now(timezone.utc),
+        }, synchronize_session=False)
+        received[receiver_id] += count
+
+    for receiver_id, count in received.items():
+        db.session.query(User).filter(User.id == receiver_id).update(
+            {User.unread_message_count: User.unread_message_count + count},
+            synchronize_session=False
+        )
+
+
+def mark_conversation_read(user_id, partner_id):
+    """Move `user_id`'s read watermark to the newest message from `partner_id` and clear its counter"""
+    pair = conversation_pair(user_id, partner_id)
+    last_read_column, unread_column = side_columns(user_id, pair)
+
+    # Lock the row so a concurrent send cannot bump the counter between the read and the reset
+    unread = db.session.query(unread_column).filter(
+        Conversation.user_a_id == pair[0],
+        Conversation.user_b_id == pair[1]
+    ).with_for_update().scalar()
+    if unread is None:
+        return 0
+
+    newest = db.session.query(db.func.max(DirectMessage.id)).filter(
+        DirectMessage.sender_id == partner_id,
+        DirectMessage.receiver_id == user_id
+    ).scalar_subquery()
+
+    db.session.query(Conversation).filter(
+        Conversation.user_a_id == pair[0],
+        Conversation.user_b_id == pair[1]
+    ).update({
+        last_read_column: newest,
+        unread_column: 0,
+        Conversation.updated_at: datetime.now(timezone.utc),
+    }, synchronize_session=False)
+
+    if unread:
+        db.session.query(User).filter(User.id == user_id).update(
+            {User.unread_message_count: User.unread_message_count - unread},
+            synchronize_session=False
+        )
+        # Keep the per-message flag in step for clients that still read it, in one statement
+        db.session.query(DirectMessage).filter(
+            DirectMessage.sender_id == partner_id,
+            DirectMessage.receiver_id == user_id,
+            DirectMessage.is_read == False
+        ).update({DirectMessage.is_read: True}, synchronize_session=False)
+    return unread
+
+
+def unread_total(user_id):
+    """Unread direct messages across all of a user's conversations (a primary key lookup)"""
+    return db.session.query(User.unread_message_count).filter(User.id == user_id).scalar() or 0
+
+
+def _side_page(user_id, user_column, partner_column, limit, before):
+    """The newest `limit` conversations with `user_id` in `user_column`, read in order off that side's index"""
+    block_exists = db.session.query(UserBlock.id).filter(
+        ((UserBlock.blocker_id == user_id) & (UserBlock.blocked_id == partner_column)) |
+        ((UserBlock.blocker_id == partner_column) & (UserBlock.blocked_id == user_id))
+    ).exists()
+    query = db.session.query(
+        Conversation.id.label('conversation_id'),
+        Conversation.last_timestamp.label('last_timestamp'),
+        partner_column.label('partner_id')
+    ).filter(
+        user_column == user_id,
+        Conversation.last_timestamp.isnot(None),
+        ~block_exists
+    )
+    if before is not None:
+        query = query.filter(db.tuple_(Conversation.last_timestamp, Conversation.id) < db.tuple_(*before))
+    page = query.order_by(Conversation.last_timestamp.desc(), Conversation.id.desc()).limit(limit).subquery()
+    # Wrapped so the branch keeps its own ORDER BY and LIMIT inside the UNION ALL
+    return db.select(page)
+
+
+def recent_conversations(user_id, limit, before=None):
+    """Query the user's `limit` most recently active conversations, newest first.
+
+    Rows carry the partner's id and username, the conversation's
+    last_timestamp and conversation_id, with User, Conversation and the
+    newest DirectMessage joined for callers to add columns from. Each side
+    of the pair (user_a_id, user_b_id) reads at most `limit` summaries off
+    its own (user_x_id, last_timestamp, id) index, skipping partners with a
+    blocking relationship in either direction, and the two short lists are
+    merged. `before` is the (last_timestamp, conversation_id) key of the
+    last row of the previous page; a `limit` of None reads every
+    conversation.
+    """
+    sides = db.union_all(
+        _side_page(user_id, Conversation.user_a_id, Conversation.user_b_id, limit, before),
+        _side_page(user_id, Conversation.user_b_id, Conversation.user_a_id, limit, before)
+    ).subquery()
+
+    return db.session.query(
+        User.id,
+        User.username,
+        sides.c.last_timestamp,
+        sides.c.conversation_id
+    ).select_from(sides).join(
+        Conversation,
+        Conversation.id == sides.c.conversation_id
+    ).join(
+        User,
+        User.id == sides.c.partner_id
+    ).join(
+        DirectMessage,
+        DirectMessage.id == Conversation.last_message_id
+    ).order_by(
+        sides.c.last_timestamp.desc(),
+        sides.c.conversation_id.desc()
+    ).limit(limit)
+
+
+def parse_conversation_cursor(cursor):
+    """Decode a conversation-list cursor into its (last_timestamp, conversation_id) key, or None"""
+    if not cursor:
+        return None
+    last_timestamp, conversation_id = decode_cursor(cursor)
+    return datetime.fromisoformat(last_timestamp), int(conversation_id)
+
+
+def conversation_page_cursor(rows, limit):
+    """Cursor for the page after `rows` (fetched with limit + 1), or None on the last page"""
+    if len(rows) <= limit:
+        return None
+    last = rows[limit - 1]
+    return encode_cursor(last.last_timestamp, last.conversation_id)
+
+
+def sync_changes(user_id, since, limit, after_id=None):
+    """Conversations and messages of `user_id` that changed after `since` (or everything when None).
+
+    Returns (conversations, messages, has_more). Conversations come back as
+    summary rows including both read watermarks; messages are at most
+    `limit` rows in send order after message `after_id`, and has_more is
+    set when more remain.
+    """
+    mine = (Conversation.user_a_id == user_id) | (Conversation.user_b_id == user_id)
+    partner_id = db.case(
+        (Conversation.user_a_id == user_id, Conversation.user_b_id),
+        else_=Conversation.user_a_id
+    )
+    block_exists = db.session.query(UserBlock.id).filter(
+        ((UserBlock.blocker_id == user_id) & (UserBlock.blocked_id == partner_id)) |
+        ((UserBlock.blocker_id == partner_id) & (UserBlock.blocked_id == user_id))
+    ).exists()
+    is_a = Conversation.user_a_id == user_id
+
+    query = db.session.query(
+        Conversation.id,
+        partner_id.label('user_id'),
+        User.username,
+        User.photo_url,
+        Conversation.last_message_id,
+        Conversation.last_timestamp,
+        db.case((is_a, Conversation.user_a_unread_count), else_=Conversation.user_b_unread_count).label('unread_count'),
+        db.case((is_a, Conversation.user_a_last_read_message_id), else_=Conversation.user_b_last_read_message_id).label('last_read_message_id'),
+        db.case((is_a, Conversation.user_b_last_read_message_id), else_=Conversation.user_a_last_read_message_id).label('partner_last_read_message_id')
+    ).join(User, User.id == partner_id).filter(mine, ~block_exists)
+    if since is None:
+        # A first sync returns the conversation list only; history is fetched per conversation
+        return query.order_by(Conversation.id).all(), [], False
+
+    window = since - SYNC_OVERLAP
+    conversations = query.filter(Conversation.updated_at > window).order_by(Conversation.id).all()
+    if not conversations:
+        return conversations, [], False
+
+    messages = DirectMessage.query.filter(
+        DirectMessage.conversation_id.in_([conversation.id for conversation in conversations]),
+        DirectMessage.timestamp > window
+    )
+    if after_id is not None:
+        messages = messages.filter(DirectMessage.id > after_id)
+    messages = messages.order_by(DirectMessage.id).limit(limit + 1).all()
+    return conversations, messages[:limit], len(messages) > limit
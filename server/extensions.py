@@ -7,3 +7,14 @@ bcrypt = Bcrypt()
 db = SQLAlchemy()
 migrate = Migrate()
 cors = CORS()
+
+def dialect_insert(table):
+    """INSERT for `table` with ON CONFLICT support on the configured database (PostgreSQL or SQLite)"""
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"INSERT ... ON CONFLICT is not supported on {dialect}")
+    return insert(table)
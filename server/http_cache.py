@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+
+# status: HTTP status to act on; body: raw bytes; changed: False when the body is the
+# one last passed to mark_seen(), so callers can skip parsing it; key: the cache entry
+# (None when the response did not go through the cache)
+CachedResponse = namedtuple('CachedResponse', ['status', 'body', 'changed', 'key'])
+
+
+class HttpCache:
+    """On-disk cache for upstream GETs that honors ETag/Last-Modified and a TTL.
+
+    Within `ttl` seconds of the last fetch an entry is served from disk
+    without touching the network. After that the request is revalidated
+    with If-None-Match / If-Modified-Since, and a 304 counts as a hit. With
+    offline=True the network is never used and stored entries are served
+    regardless of age. A body only stops counting as changed once the
+    caller has handled it and called mark_seen(), so a failed import sees
+    the same body as changed again next time.
+    """
+
+    def __init__(self, directory, ttl=0, offline=False):
+        self.directory = directory
+        self.ttl = ttl
+        self.offline = offline
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'revalidated': 0, 'misses': 0}
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, http, url, params=None, timeout=None):
+        key = self._key(url, params)
+        meta = self._read_meta(key)
+
+        if meta and (self.offline or time.time() - meta['fetched_at'] < self.ttl):
+            self._count('hits')
+            return CachedResponse(200, self._read_body(key), self._unseen(meta), key)
+        if self.offline:
+            self._count('misses')
+            return CachedResponse(504, b'', True, None)
+
+        headers = {}
+        if meta and meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta and meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+        response = http.get(url, params=params, headers=headers, timeout=timeout)
+
+        if response.status_code == 304 and meta:
+            meta['fetched_at'] = time.time()
+            self._write_meta(key, meta)
+            self._count('revalidated')
+            return CachedResponse(200, self._read_body(key), self._unseen(meta), key)
+
+        self._count('misses')
+        if response.status_code != 200:
+            return CachedResponse(response.status_code, response.content, True, None)
+
+        # Servers without validators still get change detection from the body hash
+        meta = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'sha256': hashlib.sha256(response.content).hexdigest(),
+            'seen_sha256': meta.get('seen_sha256') if meta else None,
+            'fetched_at': time.time(),
+        }
+        self._write_body(key, response.content)
+        self._write_meta(key, meta)
+        return CachedResponse(200, response.content, self._unseen(meta), key)
+
+    def mark_seen(self, response):
+        """Record that `response` was fully handled, so the same body is unchanged from now on"""
+        if response.key is None:
+            return
+        meta = self._read_meta(response.key)
+        if meta is None:
+            return
+        meta['seen_sha256'] = hashlib.sha256(response.body).hexdigest()
+        self._write_meta(response.key, meta)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    @staticmethod
+    def _unseen(meta):
+        return meta.get('seen_sha256') != meta['sha256']
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    @staticmethod
+    def _key(url, params):
+        # Hashed so API keys in the query string never end up in file names
+        raw = url + '?' + json.dumps(sorted((params or {}).items()))
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, f"{key}.{suffix}")
+
+    def _read_meta(self, key):
+        try:
+            with open(self._path(key, 'meta.json')) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # A metadata file without its body is as good as no entry
+        return meta if os.path.exists(self._path(key, 'body')) else None
+
+    def _read_body(self, key):
+        with open(self._path(key, 'body'), 'rb') as f:
+            return f.read()
+
+    def _write_meta(self, key, meta):
+        self._write_atomic(self._path(key, 'meta.json'), json.dumps(meta).encode('utf-8'))
+
+    def _write_body(self, key, body):
+        self._write_atomic(self._path(key, 'body'), body)
+
+    @staticmethod
+    def _write_atomic(path, data):
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
@@ -0,0 +1,192 @@
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from server.api_utils import fetch_and_add_events
+from server.extensions import db
+from server.metrics import metrics, IMPORT_BUCKETS
+from server.models import ImportJob
+
+# How many finished jobs to keep for the status endpoint
+MAX_JOB_HISTORY = 50
+UNFINISHED = ('queued', 'running')
+
+IMPORT_DURATION = metrics.histogram(
+    'event_import_duration_seconds', 'Time taken by event import jobs', ['status'], buckets=IMPORT_BUCKETS)
+LAST_IMPORT_SUCCESS = metrics.gauge(
+    'event_import_last_success_timestamp_seconds', 'Unix time the last event import job succeeded')
+
+
+class ImportScheduler:
+    """Runs event imports on a background thread instead of on a request or at boot.
+
+    Jobs are rows in import_jobs, so any worker process can queue one with
+    submit() (the import endpoint) and report on any of them. Only the
+    process created with scheduler=True (EVENT_IMPORT_SCHEDULER) runs the
+    timer, which queues a job every `interval` seconds (0 disables it), and
+    claims queued jobs, looking every `poll_interval` seconds or as soon as
+    it queues one itself. A claim is a conditional UPDATE, so a job never
+    runs twice even if two processes are configured as the scheduler. With
+    mode="off" nothing touches the upstream API and submitted jobs finish
+    immediately as "skipped", which keeps offline development and tests
+    self-contained.
+    """
+
+    def __init__(self, app, interval=0, mode='background', scheduler=True, poll_interval=5,
+                 import_func=fetch_and_add_events):
+        self.app = app
+        self.interval = interval
+        self.mode = mode
+        self.scheduler = scheduler
+        self.poll_interval = poll_interval
+        self.import_func = import_func
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._started = False
+
+    def start(self):
+        """Start the worker (and timer) threads in the scheduler process; safe to call more than once"""
+        with self._lock:
+            if self._started or self.mode == 'off' or not self.scheduler:
+                return
+            self._started = True
+        with self.app.app_context():
+            self._fail_interrupted()
+        threading.Thread(target=self._work, name='event-import-worker', daemon=True).start()
+        if self.interval > 0:
+            threading.Thread(target=self._tick, name='event-import-timer', daemon=True).start()
+
+    def submit(self, trigger='manual'):
+        """Queue an import and return its job id without waiting for it"""
+        now = datetime.now(timezone.utc)
+        with self.app.app_context():
+            # Coalesce with an import that has not finished yet, whichever process queued it
+            pending = db.session.query(ImportJob.id).filter(
+                ImportJob.status.in_(UNFINISHED)
+            ).order_by(ImportJob.submitted_at).first()
+            if pending:
+                return pending.id
+
+            job = ImportJob(id=uuid.uuid4().hex, trigger=trigger, status='queued', submitted_at=now)
+            if self.mode == 'off':
+                job.status = 'skipped'
+                job.finished_at = now
+            db.session.add(job)
+            db.session.commit()
+            job_id = job.id
+
+        if self.mode != 'off':
+            self.start()
+            self._wakeup.set()
+        return job_id
+
+    def get_job(self, job_id):
+        """Return a job's status as a dict, or None if it is unknown"""
+        with self.app.app_context():
+            job = db.session.get(ImportJob, job_id)
+            if job is None:
+                return None
+            return {
+                'id': job.id,
+                'trigger': job.trigger,
+                'status': job.status,
+                'submitted_at': _isoformat(job.submitted_at),
+                'started_at': _isoformat(job.started_at),
+                'finished_at': _isoformat(job.finished_at),
+                'error': job.error,
+            }
+
+    def run_pending(self):
+        """Claim and run queued jobs one at a time until none are left; returns how many ran"""
+        ran = 0
+        while True:
+            with self.app.app_context():
+                job_id = self._claim()
+            if job_id is None:
+                return ran
+            self._run(job_id)
+            ran += 1
+
+    def _claim(self):
+        """Mark the oldest queued job as running and return its id, or None if there is none (or another process won it)"""
+        job_id = db.session.query(ImportJob.id).filter(
+            ImportJob.status == 'queued'
+        ).order_by(ImportJob.submitted_at).limit(1).scalar()
+        if job_id is None:
+            return None
+        claimed = db.session.query(ImportJob).filter(
+            ImportJob.id == job_id,
+            ImportJob.status == 'queued'
+        ).update({
+            ImportJob.status: 'running',
+            ImportJob.started_at: datetime.now(timezone.utc),
+        }, synchronize_session=False)
+        db.session.commit()
+        return job_id if claimed else None
+
+    def _run(self, job_id):
+        started = time.perf_counter()
+        try:
+            with self.app.app_context():
+                self.import_func()
+            self._finish(job_id, 'succeeded')
+            IMPORT_DURATION.labels('succeeded').observe(time.perf_counter() - started)
+            LAST_IMPORT_SUCCESS.labels().set(time.time())
+        except Exception as e:
+            print(f"Error importing events (job {job_id}): {str(e)}")
+            self._finish(job_id, 'failed', str(e))
+            IMPORT_DURATION.labels('failed').observe(time.perf_counter() - started)
+
+    def _finish(self, job_id, status, error=None):
+        with self.app.app_context():
+            db.session.query(ImportJob).filter(ImportJob.id == job_id).update({
+                ImportJob.status: status,
+                ImportJob.error: error,
+                ImportJob.finished_at: datetime.now(timezone.utc),
+            }, synchronize_session=False)
+            # Forget all but the newest finished jobs
+            newest = db.session.query(ImportJob.id).order_by(
+                ImportJob.submitted_at.desc()
+            ).limit(MAX_JOB_HISTORY).subquery()
+            db.session.query(ImportJob).filter(
+                ImportJob.status.notin_(UNFINISHED),
+                ImportJob.id.notin_(db.select(newest.c.id))
+            ).delete(synchronize_session=False)
+            db.session.commit()
+
+    def _fail_interrupted(self):
+        """Jobs left running by a scheduler that stopped would block new imports forever"""
+        db.session.query(ImportJob).filter(ImportJob.status == 'running').update({
+            ImportJob.status: 'failed',
+            ImportJob.error: 'Interrupted before it finished',
+            ImportJob.finished_at: datetime.now(timezone.utc),
+        }, synchronize_session=False)
+        db.session.commit()
+
+    def _work(self):
+        while True:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            try:
+                self.run_pending()
+            except Exception as e:
+                print(f"Error checking for queued event imports: {str(e)}")
+
+    def _tick(self):
+        stop = threading.Event()
+        while True:
+            try:
+                self.submit(trigger='scheduled')
+            except Exception as e:
+                print(f"Error queuing a scheduled event import: {str(e)}")
+            stop.wait(self.interval)
+
+
+def _isoformat(value):
+    if value is None:
+        return None
+    # SQLite hands back naive datetimes; every stored time is UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.isoformat()
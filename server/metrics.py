@@ -0,0 +1,313 @@
+import threading
+import time
+from bisect import bisect_left, bisect_right
+
+from flask import Request, g, request
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+from server.extensions import db
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+IMPORT_BUCKETS = (1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+ROOM_SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+
+def _format_labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _CounterChild:
+    __slots__ = ('_lock', 'value')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class _GaugeChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        # A single attribute store, so no lock is needed
+        self.value = value
+
+
+class _HistogramChild:
+    __slots__ = ('_lock', '_upper_bounds', '_counts', '_sum')
+
+    def __init__(self, upper_bounds):
+        self._lock = threading.Lock()
+        self._upper_bounds = upper_bounds
+        self._counts = [0] * (len(upper_bounds) + 1)
+        self._sum = 0.0
+
+    def observe(self, value):
+        index = bisect_left(self._upper_bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self):
+        with self._lock:
+            return list(self._counts), self._sum
+
+
+class _Metric:
+    child_class = None
+    kind = None
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """The child for these label values, created on first use"""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        return self.child_class()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for values, child in sorted(self._children.copy().items()):
+            lines.append(f'{self.name}{_format_labels(self.label_names, values)} {_format_value(child.value)}')
+        return lines
+
+
+class Counter(_Metric):
+    child_class = _CounterChild
+    kind = 'counter'
+
+
+class Gauge(_Metric):
+    child_class = _GaugeChild
+    kind = 'gauge'
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, label_names=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.upper_bounds = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.upper_bounds)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for values, child in sorted(self._children.copy().items()):
+            counts, total = child.snapshot()
+            cumulative = 0
+            for upper_bound, count in zip(self.upper_bounds + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_format_value(upper_bound)}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.label_names, values, le)} {cumulative}')
+            labels = _format_labels(self.label_names, values)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class _TimedRequest(Request):
+    """Request that remembers when it was created, for HTTP requests and Socket.IO events alike"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.started = time.perf_counter()
+
+
+class MetricsRegistry:
+    """Process-wide metrics rendered in the Prometheus text format.
+
+    Recording is lock-light: a metric's children are looked up with a
+    plain dict read, and each child guards its few counters with its own
+    lock, so concurrent requests only contend when they update the same
+    route or event at the same instant. Gauges that describe current
+    state (socket connections, room sizes, pool usage) are computed by
+    collectors when the metrics are scraped and cost nothing in between.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self.enabled = True
+        self.http_duration = self.histogram(
+            'http_request_duration_seconds', 'Time to handle an HTTP request', ['method', 'endpoint', 'status'])
+        self.socketio_duration = self.histogram(
+            'socketio_event_duration_seconds', 'Time to handle a Socket.IO event', ['event', 'outcome'])
+        self.pool_checkout = self.histogram(
+            'db_pool_checkout_seconds',
+            'Time to get a database connection, including waiting for a free one or opening a new one')
+        self.pool_connections_opened = self.counter(
+            'db_pool_connections_opened_total', 'New DBAPI connections opened by the pool')
+
+    def counter(self, name, documentation, label_names=()):
+        return self._register(Counter(name, documentation, label_names))
+
+    def gauge(self, name, documentation, label_names=()):
+        return self._register(Gauge(name, documentation, label_names))
+
+    def histogram(self, name, documentation, label_names=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def add_collector(self, collect):
+        """Call collect() on every scrape; it returns (name, type, help, [(labels dict, value)]) tuples"""
+        self._collectors.append(collect)
+
+    def init_app(self, app):
+        self.enabled = app.config['METRICS']
+        if not self.enabled:
+            return
+        app.request_class = _TimedRequest
+        app.after_request(self._remember_status)
+        app.teardown_request(self._observe_request)
+        with app.app_context():
+            self.instrument_engine(db.engine)
+        self.add_collector(self._collect_pool)
+
+    def instrument_engine(self, engine):
+        """Time connection checkouts from the engine's pool, and keep doing so after dispose()"""
+        event.listen(engine, 'connect', lambda *args: self.pool_connections_opened.labels().inc())
+        event.listen(engine, 'engine_disposed', lambda engine: self._time_checkouts(engine.pool))
+        self._time_checkouts(engine.pool)
+        self._engine = engine
+
+    def _time_checkouts(self, pool):
+        connect = pool.connect
+        checkout = self.pool_checkout.labels()
+
+        def timed_connect():
+            started = time.perf_counter()
+            try:
+                return connect()
+            finally:
+                checkout.observe(time.perf_counter() - started)
+
+        # Engine.raw_connection() looks up pool.connect on every checkout
+        pool.connect = timed_connect
+
+    def _remember_status(self, response):
+        g.metrics_status = response.status_code
+        return response
+
+    def _observe_request(self, exc):
+        # Each lookup through the request proxy costs about as much as the observation itself
+        current = request._get_current_object()
+        started = getattr(current, 'started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        socket_event = getattr(current, 'event', None)
+        if socket_event:
+            outcome = 'error' if exc is not None else 'ok'
+            self.socketio_duration.labels(socket_event['message'], outcome).observe(elapsed)
+        else:
+            status = 500 if exc is not None else g.get('metrics_status', 500)
+            endpoint = current.endpoint or 'unmatched'
+            self.http_duration.labels(current.method, endpoint, str(status)).observe(elapsed)
+
+    def _collect_pool(self):
+        pool = self._engine.pool
+        if not isinstance(pool, QueuePool):
+            return []
+        return [
+            ('db_pool_size', 'gauge', 'Connections the pool keeps open', [({}, pool.size())]),
+            ('db_pool_checked_out', 'gauge', 'Connections currently in use', [({}, pool.checkedout())]),
+            ('db_pool_checked_in', 'gauge', 'Idle connections in the pool', [({}, pool.checkedin())]),
+            ('db_pool_overflow', 'gauge', 'Connections open beyond the pool size', [({}, pool.overflow())]),
+        ]
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            for name, kind, documentation, samples in collect():
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+
+def socketio_collector(socketio, identities, room_prefix='event_', size_buckets=ROOM_SIZE_BUCKETS):
+    """Collector for connected sockets and the sizes of the chat rooms in this process.
+
+    Rooms are summarised rather than reported one series per room, so the
+    number of series stays fixed however many events have open chats.
+    """
+
+    def collect():
+        if socketio.server is None:
+            return []
+        # rooms[namespace][room] maps member sids; room None holds every connected sid
+        rooms = socketio.server.manager.rooms.get('/', {})
+        sizes = sorted(len(members) for room, members in list(rooms.items())
+                       if isinstance(room, str) and room.startswith(room_prefix))
+        return [
+            ('socketio_connections', 'gauge', 'Connected Socket.IO clients',
+             [({}, len(rooms.get(None, ())))]),
+            ('socketio_authenticated_connections', 'gauge', 'Connected Socket.IO clients with a logged in user',
+             [({}, identities.count())]),
+            ('socketio_chat_rooms', 'gauge', 'Chat rooms with at least one socket joined',
+             [({}, len(sizes))]),
+            ('socketio_chat_room_members', 'gauge', 'Sockets joined to chat rooms, summed over all rooms',
+             [({}, sum(sizes))]),
+            ('socketio_chat_room_members_max', 'gauge', 'Sockets joined to the largest chat room',
+             [({}, sizes[-1] if sizes else 0)]),
+            ('socketio_chat_rooms_by_size', 'gauge', 'Chat rooms with at most `le` sockets joined',
+             [({'le': _format_value(bound)}, bisect_right(sizes, bound))
+              for bound in size_buckets + (float('inf'),)]),
+        ]
+
+    return collect
+
+
+def http_cache_collector(cache):
+    """Collector for lookups served by the upstream response cache, by how they were answered"""
+
+    def collect():
+        return [
+            ('edmtrain_http_cache_requests_total', 'counter',
+             'EDMTrain requests answered from the cache (hit), after a 304 (revalidated) or by a full fetch (miss)',
+             [({'result': result}, count) for result, count in sorted(cache.stats().items())]),
+        ]
+
+    return collect
+
+
+metrics = MetricsRegistry()
@@ -3,12 +3,32 @@ from sqlalchemy_serializer import SerializerMixin
 from sqlalchemy.orm import validates, relationship
 from server.extensions import db, bcrypt
 from datetime import datetime, timezone
+from uuid import uuid4
+
+# Formats seen in the free-form Event.date column, most common first
+EVENT_DATE_FORMATS = ('%Y-%m-%d', '%m/%d/%Y', '%B %d, %Y', '%b %d, %Y')
+
+def parse_event_date(value):
+    """Parse a free-form event date string into a date, or None if unrecognized"""
+    if not value:
+        return None
+    value = value.strip()
+    for fmt in EVENT_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    try:
+        return datetime.fromisoformat(value).date()
+    except ValueError:
+        return None
 
 # Association table for users attending events
 user_event = db.Table(
     'user_event',
     db.Column('user_id', db.Integer, db.ForeignKey('users_table.id'), primary_key=True),
-    db.Column('event_id', db.Integer, db.ForeignKey('events_table.id'), primary_key=True)
+    db.Column('event_id', db.Integer, db.ForeignKey('events_table.id'), primary_key=True),
+    db.Index('ix_user_event_event_id_user_id', 'event_id', 'user_id')  # Attendee lookups by event
 )
 
 class User(db.Model, SerializerMixin):
@@ -40,6 +60,8 @@ class User(db.Model, SerializerMixin):
     question1_answer = db.Column(db.String(300))
     question2_answer = db.Column(db.String(300))
     question3_answer = db.Column(db.String(300))
+    # Total unread direct messages, maintained with Conversation's per-side counters
+    unread_message_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     # Relationships
     messages = db.relationship("ChatMessage", back_populates="user", cascade="all, delete-orphan", lazy='select')
@@ -118,17 +140,24 @@ class User(db.Model, SerializerMixin):
         return [{'id': block.blocker.id, 'username': block.blocker.username} 
                 for block in self.received_blocks]
 
+    @property
+    def block_set(self):
+        """Cached ids this user has blocked / been blocked by (see server.block_cache)"""
+        from server.block_cache import get_block_set  # avoid a circular import
+        return get_block_set(self.id)
+
     def is_blocked_by(self, user_id):
         """Check if this user is blocked by another user"""
-        return any(block.blocker_id == user_id for block in self.received_blocks)
+        return user_id in self.block_set.blocked_by
 
     def has_blocked(self, user_id):
         """Check if this user has blocked another user"""
-        return any(block.blocked_id == user_id for block in self.sent_blocks)
+        return user_id in self.block_set.blocked
 
     def is_blocking_relationship(self, user_id):
         """Check if there's any blocking relationship between users (either direction)"""
-        return self.is_blocked_by(user_id) or self.has_blocked(user_id)
+        block_set = self.block_set
+        return user_id in block_set.blocked or user_id in block_set.blocked_by
 
     @hybrid_property
     def hashed_password(self):
@@ -178,7 +207,8 @@ class UserBlock(db.Model, SerializerMixin):
     # Constraints
     __table_args__ = (
         db.UniqueConstraint('blocker_id', 'blocked_id', name='unique_block_pair'),
-        db.CheckConstraint('blocker_id != blocked_id', name='no_self_block')
+        db.CheckConstraint('blocker_id != blocked_id', name='no_self_block'),
+        db.Index('ix_user_blocks_blocked_id_blocker_id', 'blocked_id', 'blocker_id')
     )
 
     @validates('blocker_id', 'blocked_id')
@@ -205,6 +235,11 @@ class FriendRequest(db.Model, SerializerMixin):
     sender = db.relationship('User', foreign_keys=[sender_id], back_populates='sent_requests', lazy='joined')
     receiver = db.relationship('User', foreign_keys=[receiver_id], back_populates='received_requests', lazy='joined')
 
+    __table_args__ = (
+        db.Index('ix_friend_requests_sender_id_receiver_id', 'sender_id', 'receiver_id'),
+        db.Index('ix_friend_requests_receiver_id_sender_id', 'receiver_id', 'sender_id'),
+    )
+
     @validates('status')
     def validate_status(self, key, value):
         normalized_value = value.strip().upper()
@@ -216,7 +251,8 @@ class FriendRequest(db.Model, SerializerMixin):
 friend_association = db.Table(
     'friend_association',
     db.Column('user_id', db.Integer, db.ForeignKey('users_table.id'), primary_key=True),
-    db.Column('friend_id', db.Integer, db.ForeignKey('users_table.id'), primary_key=True)
+    db.Column('friend_id', db.Integer, db.ForeignKey('users_table.id'), primary_key=True),
+    db.Index('ix_friend_association_friend_id_user_id', 'friend_id', 'user_id')  # related_friends backref
 )
 
 class EventPhoto(db.Model, SerializerMixin):
@@ -231,6 +267,11 @@ class EventPhoto(db.Model, SerializerMixin):
     # Relationship with Event
     event = db.relationship("Event", back_populates="photos", lazy='joined')
 
+    __table_args__ = (
+        # An event's photos, loaded with every serialized event
+        db.Index('ix_event_photos_event_id', 'event_id'),
+    )
+
     @validates('url')
     def validate_url(self, key, value):
         if not value.strip():
@@ -246,13 +287,23 @@ class Event(db.Model, SerializerMixin):
         '-photos.event'  # Prevents circular references
     )
 
+    # Keyset pagination indexes for GET /api/events
+    __table_args__ = (
+        db.Index('ix_events_table_starts_on_id', 'starts_on', 'id'),
+        db.Index('ix_events_table_city_starts_on_id', 'city', 'starts_on', 'id'),
+        # Import deduplication key, the conflict target of the upsert in api_utils
+        db.UniqueConstraint('source', 'external_id', name='uq_events_table_source_external_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False)
     date = db.Column(db.String(50), nullable=False)
+    starts_on = db.Column(db.Date)  # Typed copy of `date`, kept in sync by validate_date
     venue_name = db.Column(db.String(255), nullable=False)
     city = db.Column(db.String(100), nullable=False)
     photo = db.Column(db.String(255))
     source = db.Column(db.String(100))
+    external_id = db.Column(db.String(255))  # Upstream id (or normalized name|date|venue key)
     
 
     # Photos relationship
@@ -290,6 +341,7 @@ class Event(db.Model, SerializerMixin):
     def validate_date(self, key, value):
         if not value.strip():
             raise ValueError('Event date cannot be empty')
+        self.starts_on = parse_event_date(value)
         return value
 
     @validates('venue_name')
@@ -319,6 +371,8 @@ class ChatMessage(db.Model, SerializerMixin):
     username = db.Column(db.String(80), nullable=False)
     message = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    # Known before the row is written, so write-behind broadcasts and stored copies de-duplicate
+    uuid = db.Column(db.String(36), default=lambda: str(uuid4()))
 
     event = db.relationship(
         "Event", 
@@ -332,6 +386,10 @@ class ChatMessage(db.Model, SerializerMixin):
         lazy='joined'
     )
 
+    __table_args__ = (
+        db.Index('ix_chat_message_event_id_id', 'event_id', 'id'),
+    )
+
 class DirectMessage(db.Model, SerializerMixin):
         __tablename__ = 'direct_messages'
 
@@ -343,7 +401,79 @@ class DirectMessage(db.Model, SerializerMixin):
         message = db.Column(db.Text, nullable=False)
         timestamp = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
         is_read = db.Column(db.Boolean, default=False)
+        # Canonical key of the ordered (sender, receiver) pair; NULL only for messages to oneself
+        conversation_id = db.Column(db.Integer, db.ForeignKey('conversations.id'))
+        # Known before the row is written, so write-behind broadcasts and synced copies de-duplicate
+        uuid = db.Column(db.String(36), default=lambda: str(uuid4()))
 
         #    Relationships
         sender = db.relationship('User', foreign_keys=[sender_id], backref='sent_messages', lazy='joined')
-        receiver = db.relationship('User', foreign_keys=[receiver_id], backref='received_messages', lazy='joined')
\ No newline at end of file
+        receiver = db.relationship('User', foreign_keys=[receiver_id], backref='received_messages', lazy='joined')
+
+        __table_args__ = (
+            # One direction of a conversation (mark-read, newest message from a partner)
+            db.Index('ix_direct_messages_sender_receiver_timestamp', 'sender_id', 'receiver_id', 'timestamp'),
+            # Unread counts per receiver
+            db.Index('ix_direct_messages_receiver_is_read', 'receiver_id', 'is_read', 'sender_id'),
+            # A whole conversation as one contiguous range, in send order
+            db.Index('ix_direct_messages_conversation_id_id', 'conversation_id', 'id'),
+        )
+
+
+class Conversation(db.Model, SerializerMixin):
+    """Summary of a pair of users' direct messages, stored once per pair with user_a_id < user_b_id.
+
+    The newest message and each side's unread counter are updated in the
+    same transaction as every new DirectMessage, and each side has a read
+    watermark (the newest message id it has read), so conversation lists
+    and unread badges never have to scan messages.
+    """
+    __tablename__ = 'conversations'
+
+    serialize_rules = ('-user_a', '-user_b')
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_a_id = db.Column(db.Integer, db.ForeignKey('users_table.id'), nullable=False)
+    user_b_id = db.Column(db.Integer, db.ForeignKey('users_table.id'), nullable=False)
+    user_a_last_read_message_id = db.Column(db.Integer)
+    user_b_last_read_message_id = db.Column(db.Integer)
+    user_a_unread_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    user_b_unread_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    last_message_id = db.Column(db.Integer)
+    last_timestamp = db.Column(db.DateTime)
+    # Bumped on every new message and read-state change, for incremental sync
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    user_a = db.relationship('User', foreign_keys=[user_a_id], lazy='select')
+    user_b = db.relationship('User', foreign_keys=[user_b_id], lazy='select')
+
+    __table_args__ = (
+        db.UniqueConstraint('user_a_id', 'user_b_id', name='unique_conversation_pair'),
+        db.CheckConstraint('user_a_id < user_b_id', name='ordered_conversation_pair'),
+        # Each participant's conversations, most recently active first; id breaks ties for the page cursor
+        db.Index('ix_conversations_user_a_id_last_timestamp', 'user_a_id', 'last_timestamp', 'id'),
+        db.Index('ix_conversations_user_b_id_last_timestamp', 'user_b_id', 'last_timestamp', 'id'),
+    )
+
+
+class ImportJob(db.Model, SerializerMixin):
+    """An event import requested through the API or by the timer, shared by every worker process.
+
+    Any process can queue a job; only the scheduler process claims and
+    runs them (see EVENT_IMPORT_SCHEDULER).
+    """
+    __tablename__ = 'import_jobs'
+
+    id = db.Column(db.String(32), primary_key=True)
+    trigger = db.Column(db.String(20), nullable=False)
+    # queued, running, succeeded, failed or skipped
+    status = db.Column(db.String(20), nullable=False)
+    submitted_at = db.Column(db.DateTime, nullable=False)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    error = db.Column(db.Text)
+
+    __table_args__ = (
+        # Unfinished jobs, for coalescing and claiming
+        db.Index('ix_import_jobs_status', 'status'),
+    )
@@ -0,0 +1,143 @@
+from operator import attrgetter
+
+from flask import Response, current_app, stream_with_context
+
+from sqlalchemy import Date, DateTime
+from sqlalchemy.orm import lazyload, load_only, selectinload
+from sqlalchemy_serializer import SerializerMixin
+
+from server.models import User, Event, EventPhoto, FriendRequest
+
+
+class ResponseSchema:
+    """Declarative response shape for an endpoint, compiled once into a column-only serializer.
+
+    `fields` are column names on `model`; `nested` maps relationship names to
+    the schema of the related rows. query_options() loads exactly those
+    columns, with one selectinload per nested relationship, and serialize()
+    reads them back without the recursive walk SerializerMixin.to_dict() does.
+    Date and datetime values use the same formats as to_dict().
+    """
+
+    def __init__(self, model, fields, nested=None):
+        self.model = model
+        self.fields = tuple(fields)
+        self.nested = dict(nested or {})
+
+        columns = model.__table__.c
+        self._get_fields = attrgetter(*self.fields)
+        self._single_field = len(self.fields) == 1
+        self._converters = [
+            (name, _converter_for(columns[name].type))
+            for name in self.fields
+            if _converter_for(columns[name].type)
+        ]
+        self._nested = [
+            (name, attrgetter(name), schema, getattr(model, name).property.uselist)
+            for name, schema in self.nested.items()
+        ]
+
+    @property
+    def columns(self):
+        return [getattr(self.model, name) for name in self.fields]
+
+    def query_options(self, loader=None):
+        """Loader options that fetch only this schema's columns and relationships"""
+        # Relationships outside the schema (including lazy='joined' ones) stay unloaded
+        options = [] if loader is not None else [load_only(*self.columns), lazyload('*')]
+        for name, getter, schema, _ in self._nested:
+            relationship = getattr(self.model, name)
+            child_loader = loader.selectinload(relationship) if loader is not None else selectinload(relationship)
+            options.append(child_loader.load_only(*schema.columns))
+            options.append(child_loader.lazyload('*'))
+            options.extend(schema.query_options(child_loader))
+        return options
+
+    def query(self, query):
+        return query.options(*self.query_options())
+
+    def serialize(self, obj):
+        values = self._get_fields(obj)
+        data = {self.fields[0]: values} if self._single_field else dict(zip(self.fields, values))
+        for name, convert in self._converters:
+            if data[name] is not None:
+                data[name] = convert(data[name])
+        for name, getter, schema, uselist in self._nested:
+            related = getter(obj)
+            if uselist:
+                data[name] = [schema.serialize(child) for child in related]
+            else:
+                data[name] = schema.serialize(related) if related is not None else None
+        return data
+
+    def serialize_many(self, objs):
+        serialize = self.serialize
+        return [serialize(obj) for obj in objs]
+
+
+# Rows fetched per round trip (and serialized per chunk) when streaming
+STREAM_BATCH_SIZE = 1000
+
+
+def iter_json_array(schema, query, batch_size=STREAM_BATCH_SIZE):
+    """Yield a JSON array of `query`'s rows in chunks, holding one batch in memory at a time"""
+    provider = current_app.json
+    serialize = schema.serialize
+
+    def dumps(data):
+        return provider.dumps(data, separators=(',', ':'))
+
+    yield '['
+    separator = ''
+    chunk = []
+    for obj in schema.query(query).yield_per(batch_size):
+        chunk.append(dumps(serialize(obj)))
+        if len(chunk) >= batch_size:
+            yield separator + ','.join(chunk)
+            separator = ','
+            chunk = []
+    if chunk:
+        yield separator + ','.join(chunk)
+    yield ']'
+
+
+def stream_json(chunks):
+    """Chunked application/json response from an iterable of JSON text"""
+    return Response(stream_with_context(chunks), mimetype='application/json')
+
+
+def wants_stream(request):
+    """True when a list endpoint was asked for a streamed response with ?stream=true"""
+    return request.args.get('stream', '').lower() in ('1', 'true')
+
+
+def _converter_for(column_type):
+    if isinstance(column_type, DateTime):
+        return lambda value: value.strftime(SerializerMixin.datetime_format)
+    if isinstance(column_type, Date):
+        return lambda value: value.strftime(SerializerMixin.date_format)
+    return None
+
+
+EVENT_PHOTO_SCHEMA = ResponseSchema(EventPhoto, ('id', 'url', 'event_id'))
+
+EVENT_SCHEMA = ResponseSchema(
+    Event,
+    ('id', 'name', 'date', 'starts_on', 'venue_name', 'city', 'photo', 'source', 'external_id'),
+    nested={'photos': EVENT_PHOTO_SCHEMA}
+)
+
+# Public profile fields; unlike to_dict() this never includes _hashed_password
+USER_SCHEMA = ResponseSchema(
+    User,
+    (
+        'id', 'username', 'age', 'email_address', 'bio', 'gender', 'orientation', 'sober_status',
+        'photo_url', 'question1_answer', 'question2_answer', 'question3_answer'
+    ),
+    nested={'events': EVENT_SCHEMA}
+)
+
+FRIEND_REQUEST_SCHEMA = ResponseSchema(
+    FriendRequest,
+    ('id', 'sender_id', 'receiver_id', 'status', 'timestamp')
+)
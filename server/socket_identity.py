@@ -0,0 +1,80 @@
+import threading
+
+from sqlalchemy.orm import aliased
+
+from server.extensions import db
+from server.models import User, UserBlock
+
+
+class SocketIdentity:
+    """The user behind one socket, resolved once when it connects"""
+    __slots__ = ('user_id', 'username', 'rooms')
+
+    def __init__(self, user_id, username):
+        self.user_id = user_id
+        self.username = username
+        # Chat rooms this socket joined after the event was checked to exist
+        self.rooms = set()
+
+
+class SocketIdentities:
+    """Per-sid identities of authenticated sockets, so handlers know the user without the session.
+
+    A socket is authenticated from the Flask session sent with its
+    handshake; clients reconnect after logging in or out. Anything another
+    worker can change (the username, the account itself, blocks) is re-read
+    with one primary key query per message by refresh(), so nothing here
+    needs invalidating across processes.
+    """
+
+    def __init__(self):
+        self._by_sid = {}
+        self._lock = threading.Lock()
+
+    def authenticate(self, sid, user_id):
+        """Resolve and remember the identity for `sid`; None if nobody is logged in"""
+        if user_id is None:
+            return None
+        row = db.session.query(User.id, User.username).filter(User.id == user_id).first()
+        if row is None:
+            return None
+        identity = SocketIdentity(row.id, row.username)
+        with self._lock:
+            self._by_sid[sid] = identity
+        return identity
+
+    def get(self, sid):
+        return self._by_sid.get(sid)
+
+    def count(self):
+        return len(self._by_sid)
+
+    def forget(self, sid):
+        with self._lock:
+            self._by_sid.pop(sid, None)
+
+    def refresh(self, sid, identity, receiver_id=None):
+        """Re-read the sender before a send; returns the row, or None (forgetting `sid`) if the user is gone.
+
+        The current username is copied onto the identity. With a
+        `receiver_id` the same query also returns `receiver_exists` and
+        `blocked` (a block in either direction), probing the users primary
+        key and the user_blocks indexes.
+        """
+        columns = [User.username]
+        if receiver_id is not None:
+            receiver = aliased(User)
+            columns.append(db.session.query(receiver.id).filter(receiver.id == receiver_id).exists().label('receiver_exists'))
+            columns.append(db.session.query(UserBlock.id).filter(
+                ((UserBlock.blocker_id == identity.user_id) & (UserBlock.blocked_id == receiver_id)) |
+                ((UserBlock.blocker_id == receiver_id) & (UserBlock.blocked_id == identity.user_id))
+            ).exists().label('blocked'))
+        row = db.session.query(*columns).filter(User.id == identity.user_id).first()
+        if row is None:
+            self.forget(sid)
+            return None
+        identity.username = row.username
+        return row
+
+
+socket_identities = SocketIdentities()
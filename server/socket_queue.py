@@ -0,0 +1,51 @@
+import pickle
+import queue
+import threading
+
+from socketio import PubSubManager
+
+
+class LocalPubSubManager(PubSubManager):
+    """In-process stand-in for a Redis message queue.
+
+    Every manager created on the same channel in this process receives the
+    messages the others publish, so several SocketIO servers in one process
+    behave like workers sharing a Redis queue. Selected with a
+    SOCKETIO_MESSAGE_QUEUE of ``memory://``; meant for tests and local
+    development only.
+    """
+    name = 'local'
+
+    _subscribers = {}
+    _subscribers_lock = threading.Lock()
+
+    def __init__(self, channel='flask-socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self._inbox = queue.Queue()
+        if not write_only:
+            with self._subscribers_lock:
+                self._subscribers.setdefault(channel, []).append(self._inbox)
+
+    def _publish(self, data):
+        # Pickle like the network backends do, so workers never share message objects
+        payload = pickle.dumps(data)
+        with self._subscribers_lock:
+            inboxes = list(self._subscribers.get(self.channel, []))
+        for inbox in inboxes:
+            inbox.put(payload)
+
+    def _listen(self):
+        while True:
+            yield self._inbox.get()
+
+
+def message_queue_options(config):
+    """SocketIO keyword arguments for the configured SOCKETIO_MESSAGE_QUEUE backend"""
+    url = config.get('SOCKETIO_MESSAGE_QUEUE')
+    channel = config.get('SOCKETIO_CHANNEL', 'flask-socketio')
+    if not url:
+        return {}
+    if url.startswith('memory://'):
+        return {'client_manager': LocalPubSubManager(channel=channel)}
+    # redis://, rediss:// and the other URLs Flask-SocketIO understands
+    return {'message_queue': url, 'channel': channel}
@@ -0,0 +1,110 @@
+import json
+import re
+import time
+from collections import Counter
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Collapse the expanded parameter lists of IN (...) clauses so they fingerprint alike
+_IN_LIST = re.compile(r'\((?:\s*(?:\?|%\(\w+\)s|:\w+)\s*,)+\s*(?:\?|%\(\w+\)s|:\w+)\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def fingerprint(statement):
+    """A statement with whitespace and IN-list lengths normalized, to spot repeats"""
+    return _IN_LIST.sub('(?)', _WHITESPACE.sub(' ', statement).strip())
+
+
+class QueryStats:
+    """SQL executed during one HTTP request or Socket.IO event"""
+    __slots__ = ('queries', 'total_ms', 'statements')
+
+    def __init__(self):
+        self.queries = 0
+        self.total_ms = 0.0
+        self.statements = Counter()
+
+    def suspected_n_plus_one(self, threshold):
+        """(fingerprint, count) of statements run at least `threshold` times, most repeated first"""
+        return [(statement, count) for statement, count in self.statements.most_common() if count >= threshold]
+
+
+def current_stats():
+    """QueryStats of the request or socket event being handled, if any SQL ran yet"""
+    return g.get('sql_stats') if has_app_context() else None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context, which is discarded with the statement even if it raises
+    if context is not None:
+        context._sql_stats_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_sql_stats_started', None)
+    if started is None or not has_app_context():
+        return
+    stats = g.get('sql_stats')
+    if stats is None:
+        stats = g.sql_stats = QueryStats()
+    stats.queries += 1
+    stats.total_ms += (time.perf_counter() - started) * 1000
+    stats.statements[fingerprint(statement)] += 1
+
+
+class SqlStatsRecorder:
+    """Counts queries, SQL time and repeated statements per HTTP request and per Socket.IO event.
+
+    In debug mode every HTTP response carries X-SQL-Queries, X-SQL-Time-Ms
+    and X-SQL-N-Plus-One headers. A structured log line is printed for any
+    request or event where a statement ran SQL_N_PLUS_ONE_THRESHOLD or more
+    times, or for all of them with SQL_STATS_LOG_ALL. Responses streamed
+    after the view returns only count the queries made before streaming.
+    """
+
+    _listening = False
+
+    def init_app(self, app):
+        if not app.config['SQL_STATS']:
+            return
+        if not SqlStatsRecorder._listening:
+            # Every engine, including ones created for background jobs
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            SqlStatsRecorder._listening = True
+        self.threshold = app.config['SQL_N_PLUS_ONE_THRESHOLD']
+        self.log_all = app.config['SQL_STATS_LOG_ALL']
+        app.after_request(self._add_debug_headers)
+        app.teardown_request(self._log)
+
+    def _add_debug_headers(self, response):
+        if current_app.debug:
+            stats = current_stats() or QueryStats()
+            response.headers['X-SQL-Queries'] = str(stats.queries)
+            response.headers['X-SQL-Time-Ms'] = f'{stats.total_ms:.1f}'
+            response.headers['X-SQL-N-Plus-One'] = str(len(stats.suspected_n_plus_one(self.threshold)))
+        return response
+
+    def _log(self, exc):
+        stats = current_stats()
+        if stats is None:
+            return
+        suspects = stats.suspected_n_plus_one(self.threshold)
+        if not suspects and not self.log_all:
+            return
+        socket_event = getattr(request, 'event', None)
+        record = {
+            'log': 'sql_stats',
+            'kind': 'socket' if socket_event else 'http',
+            'name': socket_event['message'] if socket_event else request.endpoint,
+            'path': request.path,
+            'queries': stats.queries,
+            'sql_ms': round(stats.total_ms, 1),
+            'n_plus_one': [{'statement': statement[:200], 'count': count} for statement, count in suspects],
+        }
+        print(json.dumps(record, separators=(',', ':')))
+
+
+sql_stats = SqlStatsRecorder()
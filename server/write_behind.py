@@ -0,0 +1,150 @@
+import atexit
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from server.extensions import db
+
+
+class MessageWriteBuffer:
+    """Buffers chat rows in memory and inserts them in batches (group commit).
+
+    A batch is flushed when it reaches `max_batch` rows or when the oldest
+    buffered row is `max_delay` seconds old, whichever comes first. Rows are
+    flushed one last time at interpreter exit so a graceful shutdown loses
+    nothing.
+    """
+
+    def __init__(self, app, max_batch=100, max_delay=0.5):
+        self.app = app
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = None
+        self._before_insert = {}
+        self._after_insert = {}
+        self._stats = {
+            'flushes': 0,
+            'rows_written': 0,
+            'rows_failed': 0,
+            'last_flush_ms': 0.0,
+            'max_flush_ms': 0.0,
+            'last_batch_size': 0,
+        }
+        atexit.register(self.close)
+
+    def add(self, model, **values):
+        """Queue a row for `model` and return its values, including the timestamp"""
+        values.setdefault('timestamp', datetime.now(timezone.utc))
+        with self._lock:
+            self._pending.append((model.__table__, values, time.monotonic()))
+            backlog = len(self._pending)
+            if self._thread is None:
+                self._start()
+        if backlog >= self.max_batch:
+            self._wakeup.set()
+        return values
+
+    def before_insert(self, model, callback):
+        """Run callback(rows) ahead of every batch inserted for `model`; it may fill in column values"""
+        self._before_insert[model.__table__] = callback
+
+    def after_insert(self, model, callback):
+        """Run callback(rows) in the same transaction as every batch inserted for `model`"""
+        self._after_insert[model.__table__] = callback
+
+    def flush(self):
+        """Write everything currently buffered, one executemany per table"""
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._pending)
+                self._pending.clear()
+            if not batch:
+                return 0
+
+            started = time.perf_counter()
+            rows_by_table = {}
+            for table, values, _ in batch:
+                rows_by_table.setdefault(table, []).append(values)
+
+            with self.app.app_context():
+                written = 0
+                for table, rows in rows_by_table.items():
+                    written += self._insert(table, rows)
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self._stats['flushes'] += 1
+                self._stats['rows_written'] += written
+                self._stats['rows_failed'] += len(batch) - written
+                self._stats['last_flush_ms'] = elapsed_ms
+                self._stats['max_flush_ms'] = max(self._stats['max_flush_ms'], elapsed_ms)
+                self._stats['last_batch_size'] = len(batch)
+            return written
+
+    def stats(self):
+        """Flush latency and backlog counters for monitoring"""
+        with self._lock:
+            oldest = self._pending[0][2] if self._pending else None
+            return {
+                **self._stats,
+                'backlog': len(self._pending),
+                'oldest_pending_age_ms': (time.monotonic() - oldest) * 1000 if oldest else 0.0,
+            }
+
+    def close(self):
+        """Stop the flusher thread and write out anything still buffered"""
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name='chat-write-behind', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(timeout=self.max_delay)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing buffered chat messages: {e}")
+
+    def _insert(self, table, rows):
+        before = self._before_insert.get(table)
+        callback = self._after_insert.get(table)
+        try:
+            if before:
+                before(rows)
+            db.session.execute(table.insert(), rows)
+            if callback:
+                callback(rows)
+            db.session.commit()
+            return len(rows)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error writing batch of {len(rows)} rows to {table.name}, retrying row by row: {e}")
+
+        # Fall back to single-row inserts so one bad row does not sink the batch
+        written = 0
+        for row in rows:
+            try:
+                if before:
+                    before([row])
+                db.session.execute(table.insert(), row)
+                if callback:
+                    callback([row])
+                db.session.commit()
+                written += 1
+            except Exception as e:
+                db.session.rollback()
+                print(f"Dropping unwritable row for {table.name}: {e}")
+        return written
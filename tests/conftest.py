@@ -0,0 +1,76 @@
+import os
+import tempfile
+
+import pytest
+
+# The app reads its configuration when it is imported, so point it at a throwaway
+# SQLite database first. Background imports and the EDMTrain response cache are off,
+# and Socket.IO uses the in-process queue so tests can attach a second worker.
+_tmp_dir = tempfile.mkdtemp(prefix='sobersync-tests-')
+os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(_tmp_dir, 'test.db')
+os.environ['UPLOAD_FOLDER'] = os.path.join(_tmp_dir, 'uploads')
+os.environ['EVENT_IMPORT_MODE'] = 'off'
+os.environ['EDMTRAIN_CACHE_DIR'] = ''
+os.environ['CHAT_WRITE_BEHIND'] = 'false'
+os.environ['SOCKETIO_MESSAGE_QUEUE'] = 'memory://'
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+
+@pytest.fixture(scope='session')
+def app():
+    """The application, with its database built by the Alembic migrations"""
+    from flask_migrate import upgrade
+    import app as app_module
+
+    with app_module.app.app_context():
+        upgrade(directory=MIGRATIONS_DIR)
+    return app_module.app
+
+
+@pytest.fixture
+def app_context(app):
+    with app.app_context():
+        yield
+
+
+@pytest.fixture(autouse=True)
+def clean_tables(app):
+    """Empty every table after each test"""
+    yield
+    from server.extensions import db
+
+    with app.app_context():
+        db.session.rollback()
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
+
+
+@pytest.fixture
+def users(app):
+    """Ids of three users: alice, bob and carol"""
+    from server.extensions import db
+    from server.models import User
+
+    with app.app_context():
+        created = [
+            User(username=name, age=30, email_address=f'{name}@example.com', _hashed_password='x')
+            for name in ('alice1', 'bobby1', 'carol1')
+        ]
+        db.session.add_all(created)
+        db.session.commit()
+        return [user.id for user in created]
+
+
+@pytest.fixture
+def login(app):
+    """login(user_id) returns a test client with that user's session"""
+
+    def login(user_id):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = user_id
+        return client
+
+    return login
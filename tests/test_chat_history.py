@@ -0,0 +1,139 @@
+"""Chat payloads, the in-memory room history and replay after reconnects"""
+import statistics
+import time
+
+import pytest
+
+import app as app_module
+from server.chat_history import RoomBuffer, RoomHistory, load_latest_messages, load_messages_after
+from server.extensions import db
+from server.models import ChatMessage, Event
+from server.write_behind import MessageWriteBuffer
+
+
+@pytest.fixture
+def event_id(app):
+    with app.app_context():
+        show = Event(name='Show', date='2030-07-01', venue_name='Hall', city='New York')
+        db.session.add(show)
+        db.session.commit()
+        return show.id
+
+
+@pytest.fixture
+def enable_write_behind(app, monkeypatch):
+    """enable_write_behind() switches save_chat_message to a write-behind buffer and returns it"""
+    buffers = []
+
+    def enable():
+        buffer = MessageWriteBuffer(app, max_batch=1000, max_delay=60)
+        monkeypatch.setattr(app_module, 'chat_write_buffer', buffer)
+        buffers.append(buffer)
+        return buffer
+
+    yield enable
+    for buffer in buffers:
+        buffer.close()
+
+
+def test_stored_payloads_carry_the_uuid(app, users, event_id):
+    with app.app_context():
+        sent = app_module.save_chat_message(event_id, users[0], 'alice1', 'hello')
+        stored, = load_latest_messages(event_id, 10)
+
+    assert sent['uuid'] and sent['id'] == sent['seq']
+    assert {**stored, 'timestamp': None} == {**sent, 'timestamp': None}
+
+
+def test_write_behind_broadcast_matches_the_stored_row_by_uuid(app, users, event_id, enable_write_behind):
+    with app.app_context():
+        before = app_module.save_chat_message(event_id, users[0], 'alice1', 'stored first')
+    write_behind = enable_write_behind()
+    with app.app_context():
+        sent = app_module.save_chat_message(event_id, users[0], 'alice1', 'queued')
+        assert sent['id'] is None and sent['seq'] is None
+        assert load_messages_after(event_id, before['seq'], 10) == []
+
+    write_behind.flush()
+
+    with app.app_context():
+        # What a reconnecting client is replayed, which it already saw live without an id
+        replayed, = load_messages_after(event_id, before['seq'], 10)
+        assert replayed['uuid'] == sent['uuid']
+        assert replayed['id'] is not None
+        assert ChatMessage.query.filter_by(uuid=sent['uuid']).count() == 1
+
+
+def payload(seq):
+    return {"id": seq, "seq": seq, "uuid": None, "username": "alice1", "message": f"m{seq}", "timestamp": ""}
+
+
+def seqs(buffer):
+    return [message["seq"] for message in buffer.messages]
+
+
+def test_room_buffer_keeps_seq_order_and_drops_duplicates():
+    buffer = RoomBuffer([payload(1), payload(2)], capacity=5)
+
+    buffer.append(payload(4))
+    buffer.append(payload(3))  # lost the race to append
+    buffer.append(payload(2))  # committed before the room was loaded
+
+    assert seqs(buffer) == [1, 2, 3, 4]
+    assert buffer.complete
+
+
+def test_room_buffer_window_slides_and_ignores_messages_older_than_it():
+    buffer = RoomBuffer([payload(seq) for seq in (1, 2, 4)], capacity=3)
+
+    buffer.append(payload(5))
+    assert seqs(buffer) == [2, 4, 5] and not buffer.complete
+    buffer.append(payload(3))
+    assert seqs(buffer) == [3, 4, 5]
+    buffer.append(payload(1))
+    assert seqs(buffer) == [3, 4, 5]
+
+
+def test_replay_from_the_buffer_is_in_seq_order():
+    history = RoomHistory(capacity=10)
+    history._rooms['room'] = RoomBuffer([payload(1)], capacity=10)
+    for seq in (2, 4, 3, 5):
+        history.append('room', 1, payload(seq))
+
+    missed, complete = history.replay('room', 1, last_seq=2)
+
+    assert [message["seq"] for message in missed] == [3, 4, 5]
+    assert complete
+
+
+def test_latest_reads_from_the_buffer_beat_the_database(app, users, event_id, capsys):
+    with app.app_context():
+        db.session.execute(ChatMessage.__table__.insert(), [
+            dict(event_id=event_id, user_id=users[0], username='alice1', message=f'message {number}')
+            for number in range(5000)
+        ])
+        db.session.commit()
+
+        history = RoomHistory(capacity=200)
+        room = f'bench_{event_id}'
+        buffered, _ = history.latest(room, event_id, 100)
+        assert buffered == load_latest_messages(event_id, 100)
+
+        timings = {}
+        for name, read in (
+            ('database', lambda: load_latest_messages(event_id, 100)),
+            ('buffer', lambda: history.latest(room, event_id, 100)),
+        ):
+            samples = []
+            for _ in range(200):
+                started = time.perf_counter()
+                read()
+                samples.append((time.perf_counter() - started) * 1000)
+            samples.sort()
+            timings[name] = (statistics.median(samples), samples[int(len(samples) * 0.99)])
+
+    assert timings['buffer'][0] < timings['database'][0]
+    with capsys.disabled():
+        for name, (p50, p99) in timings.items():
+            print(f"\nLatest 100 chat messages from the {name}: p50 {p50:.3f} ms, p99 {p99:.3f} ms", end='')
+        print()
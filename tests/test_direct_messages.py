@@ -0,0 +1,264 @@
+"""Direct messages keep the conversation summaries, unread counters and sync cursors in step"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import app as app_module
+from server.conversations import SYNC_OVERLAP, assign_conversations, conversation_pair, record_direct_messages
+from server.pagination import decode_cursor
+from server.extensions import db
+from server.models import Conversation, DirectMessage, User, UserBlock
+from server.write_behind import MessageWriteBuffer
+
+
+def conversation(user_id, other_id):
+    return Conversation.query.filter_by(
+        **dict(zip(('user_a_id', 'user_b_id'), conversation_pair(user_id, other_id)))
+    ).one()
+
+
+def side(row, user_id):
+    """(last_read_message_id, unread_count) of `user_id`'s side of a conversation row"""
+    if user_id == row.user_a_id:
+        return row.user_a_last_read_message_id, row.user_a_unread_count
+    return row.user_b_last_read_message_id, row.user_b_unread_count
+
+
+def send(client, receiver_id, message='hello'):
+    response = client.post('/api/direct-messages', json={'receiver_id': receiver_id, 'message': message})
+    assert response.status_code == 201
+    return response.get_json()
+
+
+def unread(client):
+    return client.get('/api/direct-messages/unread-count').get_json()['unread_count']
+
+
+def test_send_increments_the_receivers_counters(app, login, users):
+    alice, bob, _ = users
+    send(login(alice), bob)
+    send(login(alice), bob)
+
+    assert unread(login(bob)) == 2
+    assert unread(login(alice)) == 0
+    with app.app_context():
+        row = conversation(alice, bob)
+        assert side(row, bob)[1] == 2
+        assert side(row, alice)[1] == 0
+        assert row.last_message_id == db.session.query(db.func.max(DirectMessage.id)).scalar()
+
+
+def test_mark_read_clears_the_counter_and_moves_the_watermark(app, login, users):
+    alice, bob, _ = users
+    send(login(alice), bob, 'first')
+    newest = send(login(alice), bob, 'second')
+    send(login(bob), alice, 'reply')
+
+    response = login(bob).post(f'/api/direct-messages/mark-read/{alice}')
+
+    assert response.status_code == 200
+    assert unread(login(bob)) == 0
+    assert unread(login(alice)) == 1
+    with app.app_context():
+        row = conversation(alice, bob)
+        assert side(row, bob) == (newest['id'], 0)
+        assert DirectMessage.query.filter_by(receiver_id=bob, is_read=False).count() == 0
+
+
+def test_string_receiver_id_counts_like_an_int(app, login, users):
+    alice, bob, _ = users
+    send(login(alice), str(bob))
+    send(login(alice), bob)
+
+    assert unread(login(bob)) == 2
+    with app.app_context():
+        assert Conversation.query.count() == 1
+
+
+@pytest.mark.parametrize('receiver_id', ['abc', [1]])
+def test_invalid_receiver_id_is_rejected(login, users, receiver_id):
+    response = login(users[0]).post('/api/direct-messages', json={'receiver_id': receiver_id, 'message': 'hi'})
+
+    assert response.status_code == 400
+
+
+def test_notes_to_self_have_no_conversation_and_no_unread(app, login, users):
+    alice = users[0]
+    client = login(alice)
+    send(client, alice, 'note one')
+    send(client, alice, 'note two')
+
+    response = client.get(f'/api/direct-messages/{alice}')
+
+    assert [message['message'] for message in response.get_json()] == ['note one', 'note two']
+    assert unread(client) == 0
+    with app.app_context():
+        assert Conversation.query.count() == 0
+        assert DirectMessage.query.filter(DirectMessage.conversation_id.isnot(None)).count() == 0
+
+
+def test_write_behind_flush_assigns_conversations_and_counts(app, login, users):
+    alice, bob, carol = users
+    buffer = MessageWriteBuffer(app, max_batch=1000, max_delay=60)
+    buffer.before_insert(DirectMessage, assign_conversations)
+    buffer.after_insert(DirectMessage, record_direct_messages)
+    try:
+        for sender_id, receiver_id in ((alice, bob), (alice, bob), (carol, bob), (bob, alice), (alice, alice)):
+            buffer.add(DirectMessage, sender_id=sender_id, receiver_id=receiver_id, message='queued', is_read=False)
+        assert buffer.flush() == 5
+    finally:
+        buffer.close()
+
+    assert unread(login(bob)) == 3
+    assert unread(login(alice)) == 1
+    with app.app_context():
+        assert Conversation.query.count() == 2
+        row = conversation(alice, bob)
+        newest = db.session.query(db.func.max(DirectMessage.id)).filter(
+            DirectMessage.conversation_id == row.id
+        ).scalar()
+        assert row.last_message_id == newest
+        assert DirectMessage.query.filter_by(sender_id=alice, receiver_id=alice).one().conversation_id is None
+        assert db.session.get(User, bob).unread_message_count == 3
+
+
+def test_conversation_pages_merge_both_sides_and_skip_blocked_partners(app, login, users):
+    with app.app_context():
+        extra = [
+            User(username=f'partner{n}', age=30, email_address=f'partner{n}@example.com', _hashed_password='x')
+            for n in range(6)
+        ]
+        db.session.add_all(extra)
+        db.session.commit()
+        partners = [users[0], users[2]] + [user.id for user in extra]
+    bob = users[1]
+    # bob is user_b of his conversation with alice and user_a of all the others
+    for partner in partners:
+        send(login(partner), bob)
+    blocked = partners[3]
+    with app.app_context():
+        db.session.add(UserBlock(blocker_id=bob, blocked_id=blocked))
+        db.session.commit()
+    send(login(bob), partners[0])
+
+    client = login(bob)
+    seen, cursor = [], None
+    while True:
+        query = '?limit=3' + (f'&after={cursor}' if cursor else '')
+        page = client.get(f'/api/direct-messages/conversations{query}').get_json()
+        assert len(page['conversations']) <= 3
+        seen.extend(conversation['id'] for conversation in page['conversations'])
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+
+    newest_first = [partners[0]] + [partner for partner in reversed(partners[1:]) if partner != blocked]
+    assert seen == newest_first
+
+
+def test_conversation_lists_without_paging_args_stay_plain_arrays(login, users):
+    alice, bob, carol = users
+    send(login(bob), alice)
+    send(login(carol), alice)
+    client = login(alice)
+
+    for path in ('/api/direct-messages/conversations', '/api/direct-messages/recent'):
+        legacy = client.get(path).get_json()
+        paged = client.get(f'{path}?limit=1').get_json()
+
+        assert isinstance(legacy, list) and len(legacy) == 2
+        assert len(paged['conversations']) == 1 and paged['next_cursor']
+
+
+def sync(client, cursor=None, limit=None):
+    args = {key: value for key, value in (('since', cursor), ('limit', limit)) if value is not None}
+    response = client.get('/api/direct-messages/sync', query_string=args)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def backdate(app, seconds, **filters):
+    """Move matching messages (and their conversations' updated_at) `seconds` into the past"""
+    with app.app_context():
+        when = datetime.now(timezone.utc) - timedelta(seconds=seconds)
+        DirectMessage.query.filter_by(**filters).update({DirectMessage.timestamp: when})
+        Conversation.query.update({Conversation.updated_at: when})
+        db.session.commit()
+
+
+def test_first_sync_returns_conversations_only_and_a_fresh_cursor(login, users):
+    alice, bob, _ = users
+    send(login(alice), bob)
+
+    page = sync(login(bob))
+
+    assert [conversation['user_id'] for conversation in page['conversations']] == [alice]
+    assert page['conversations'][0]['unread_count'] == 1
+    assert page['messages'] == [] and page['has_more'] is False
+    synced_at, after_id = decode_cursor(page['cursor'])
+    assert after_id is None
+    assert datetime.now(timezone.utc) - datetime.fromisoformat(synced_at) < timedelta(seconds=5)
+
+
+def test_sync_resends_the_overlap_window_and_skips_older_messages(app, login, users):
+    alice, bob, _ = users
+    send(login(alice), bob, 'old')
+    backdate(app, 300, message='old')
+    cursor = sync(login(bob))['cursor']
+
+    # Committed late: timestamped before the cursor, but inside the overlap
+    send(login(alice), bob, 'late')
+    backdate(app, SYNC_OVERLAP.total_seconds() / 3, message='late')
+    send(login(alice), bob, 'new')
+
+    page = sync(login(bob), cursor)
+    assert [message['message'] for message in page['messages']] == ['late', 'new']
+    assert page['conversations'][0]['unread_count'] == 3
+
+    # Within the overlap the same rows come again; clients drop them by uuid
+    again = sync(login(bob), page['cursor'])
+    assert [message['uuid'] for message in again['messages']] == [message['uuid'] for message in page['messages']]
+
+
+def test_sync_pages_a_large_catch_up_from_the_same_point(login, users):
+    alice, bob, _ = users
+    cursor = sync(login(bob))['cursor']
+    for number in range(5):
+        send(login(alice), bob, f'message {number}')
+
+    pages = []
+    while True:
+        page = sync(login(bob), cursor, limit=2)
+        pages.append(page)
+        cursor = page['cursor']
+        if not page['has_more']:
+            break
+
+    assert [len(page['messages']) for page in pages] == [2, 2, 1]
+    assert [page['has_more'] for page in pages] == [True, True, False]
+    received = [message['message'] for page in pages for message in page['messages']]
+    assert received == [f'message {number}' for number in range(5)]
+    # Mid catch-up cursors keep the original time and continue after the last id
+    assert decode_cursor(pages[0]['cursor'])[1] == pages[0]['messages'][-1]['id']
+    assert decode_cursor(pages[-1]['cursor'])[1] is None
+
+
+def test_write_behind_direct_message_syncs_with_the_broadcast_uuid(app, login, users, monkeypatch):
+    alice, bob, _ = users
+    cursor = sync(login(bob))['cursor']
+    buffer = MessageWriteBuffer(app, max_batch=1000, max_delay=60)
+    buffer.before_insert(DirectMessage, assign_conversations)
+    buffer.after_insert(DirectMessage, record_direct_messages)
+    monkeypatch.setattr(app_module, 'chat_write_buffer', buffer)
+    try:
+        with app.app_context():
+            message_id, message_uuid, _ = app_module.save_direct_message(alice, bob, 'queued')
+        assert message_id is None and message_uuid
+        assert sync(login(bob), cursor)['messages'] == []
+        buffer.flush()
+    finally:
+        buffer.close()
+
+    synced, = sync(login(bob), cursor)['messages']
+    assert synced['uuid'] == message_uuid
+    assert synced['id'] is not None
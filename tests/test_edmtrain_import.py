@@ -0,0 +1,197 @@
+"""EDMTrain ingestion end to end against a local stub of the upstream API"""
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import server.api_utils as api_utils
+from server.extensions import db
+from server.models import Event
+
+
+class StubEdmtrain:
+    """Serves /locations and /events like EDMTrain, with injectable latency and failures.
+
+    Location ids are 1-based positions in `cities`. Each location has
+    `events_per_location` events whose venue is in that city. Cities in
+    `failures` answer their first N events requests with 503, and cities in
+    `hang` answer events requests only after that many seconds.
+    """
+
+    def __init__(self, cities, events_per_location=20, delay=0.0):
+        self.cities = list(cities)
+        self.events_per_location = events_per_location
+        self.delay = delay
+        self.failures = {}
+        self.hang = {}
+        self.events_requests = Counter()
+        self.client_ports = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self._server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self._server.server_port}'
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def events_for(self, location_id):
+        city = self.cities[location_id - 1]
+        return [
+            {
+                'id': location_id * 100000 + number,
+                'name': f'{city} Show {number}',
+                'date': '2030-07-01',
+                'venue': {'name': f'{city} Hall', 'location': city},
+                'photo': None,
+            }
+            for number in range(self.events_per_location)
+        ]
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.client_ports.add(self.client_address[1])
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                if url.path == '/locations':
+                    city = query['city'][0]
+                    self._send(200, {'data': [{'id': stub.cities.index(city) + 1}]})
+                else:
+                    self._events(int(query['locationIds'][0]))
+
+            def _events(self, location_id):
+                city = stub.cities[location_id - 1]
+                with stub._lock:
+                    stub.events_requests[city] += 1
+                    attempt = stub.events_requests[city]
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                try:
+                    time.sleep(stub.hang.get(city, stub.delay))
+                    if attempt <= stub.failures.get(city, 0):
+                        self._send(503, {'error': 'try again'})
+                    else:
+                        self._send(200, {'data': stub.events_for(location_id)})
+                finally:
+                    with stub._lock:
+                        stub.in_flight -= 1
+
+            def _send(self, status, body):
+                raw = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+        return Handler
+
+
+def locations(cities):
+    return [(city, 'XX') for city in cities]
+
+
+@pytest.fixture
+def edmtrain(monkeypatch):
+    """Start a stub EDMTrain and point the importer at it, with fast retries and no response cache"""
+    created = []
+
+    def start(cities, **options):
+        stub = StubEdmtrain(cities, **options)
+        stub.start()
+        created.append(stub)
+        monkeypatch.setattr(api_utils, 'EDMTRAIN_LOCATION_API_URL', stub.url + '/locations')
+        monkeypatch.setattr(api_utils, 'EDMTRAIN_EVENTS_API_URL', stub.url + '/events')
+        monkeypatch.setattr(api_utils, 'EDMTRAIN_API_KEY', 'test-key')
+        monkeypatch.setattr(api_utils, 'EDMTRAIN_BACKOFF', 0.01)
+        monkeypatch.setattr(api_utils, 'http_cache', None)
+        monkeypatch.setattr(api_utils, 'http_session', api_utils.build_http_session())
+        return stub
+
+    yield start
+    for stub in created:
+        stub.stop()
+
+
+def test_imports_every_configured_location(app_context, edmtrain):
+    cities = [f'City {number}' for number in range(5)]
+    stub = edmtrain(cities, events_per_location=20)
+
+    assert api_utils.fetch_and_add_edmtrain_events(locations(cities)) == 100
+    assert Event.query.count() == 100
+    assert dict(db.session.query(Event.city, db.func.count()).group_by(Event.city).all()) == {
+        city: 20 for city in cities
+    }
+    # Workers share one keep-alive session instead of a connection per request
+    assert len(stub.client_ports) <= api_utils.EDMTRAIN_MAX_WORKERS
+
+    # Importing the same payload again updates in place
+    assert api_utils.fetch_and_add_edmtrain_events(locations(cities), skip_unchanged=False) == 100
+    assert Event.query.count() == 100
+
+
+def test_locations_are_fetched_concurrently_on_a_bounded_pool(app_context, edmtrain):
+    cities = [f'City {number}' for number in range(8)]
+    stub = edmtrain(cities, events_per_location=1, delay=0.1)
+
+    events, _ = api_utils.fetch_all_location_events(
+        locations(cities), max_workers=3, http=api_utils.build_http_session(pool_size=3)
+    )
+
+    assert len(events) == 8
+    assert stub.max_in_flight == 3
+
+
+def test_transient_upstream_errors_are_retried(app_context, edmtrain):
+    cities = ['Steady', 'Flaky']
+    stub = edmtrain(cities, events_per_location=5)
+    stub.failures['Flaky'] = 2
+
+    assert api_utils.fetch_and_add_edmtrain_events(locations(cities)) == 10
+    assert stub.events_requests == {'Steady': 1, 'Flaky': 3}
+
+
+def test_a_location_that_times_out_is_skipped(app_context, edmtrain, monkeypatch):
+    cities = ['Quick', 'Stuck']
+    stub = edmtrain(cities, events_per_location=5)
+    stub.hang['Stuck'] = 1.0
+    monkeypatch.setattr(api_utils, 'EDMTRAIN_TIMEOUT', 0.2)
+
+    events, _ = api_utils.fetch_all_location_events(
+        locations(cities), http=api_utils.build_http_session(retries=0)
+    )
+
+    assert sorted({event['venue']['location'] for event in events}) == ['Quick']
+
+
+def test_ingest_throughput(app_context, edmtrain, capsys):
+    cities = [f'City {number}' for number in range(10)]
+    edmtrain(cities, events_per_location=500, delay=0.05)
+
+    started = time.perf_counter()
+    count = api_utils.fetch_and_add_edmtrain_events(locations(cities))
+    elapsed = time.perf_counter() - started
+
+    assert count == 5000
+    assert Event.query.count() == 5000
+    with capsys.disabled():
+        print(f"\nEDMTrain ingest: {count} events from {len(cities)} locations "
+              f"in {elapsed:.2f}s ({count / elapsed:.0f} events/s)")
@@ -0,0 +1,42 @@
+"""Friend requests validate the receiver id before the block check"""
+import pytest
+
+from server.extensions import db
+from server.models import FriendRequest, UserBlock
+
+
+@pytest.fixture
+def client(login, users):
+    return login(users[0])
+
+
+def test_string_receiver_id_is_accepted(app, client, users):
+    response = client.post('/api/friend-request', json={'receiver_id': str(users[1])})
+
+    assert response.status_code == 201
+    with app.app_context():
+        assert FriendRequest.query.filter_by(sender_id=users[0], receiver_id=users[1]).count() == 1
+
+
+def test_string_receiver_id_does_not_get_past_a_block(app, client, users):
+    with app.app_context():
+        db.session.add(UserBlock(blocker_id=users[1], blocked_id=users[0]))
+        db.session.commit()
+
+    response = client.post('/api/friend-request', json={'receiver_id': str(users[1])})
+
+    assert response.status_code == 403
+
+
+@pytest.mark.parametrize('receiver_id', ['abc', None, [2]])
+def test_invalid_receiver_id_is_rejected(client, receiver_id):
+    response = client.post('/api/friend-request', json={'receiver_id': receiver_id})
+
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'receiver_id must be an integer'}
+
+
+def test_request_to_yourself_as_a_string_is_rejected(client, users):
+    response = client.post('/api/friend-request', json={'receiver_id': str(users[0])})
+
+    assert response.status_code == 400
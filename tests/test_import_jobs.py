@@ -0,0 +1,107 @@
+"""Import jobs are shared through the database and run by the scheduler process only"""
+from datetime import datetime, timezone
+
+import pytest
+
+import server.import_jobs as import_jobs
+from server.extensions import db
+from server.import_jobs import ImportScheduler
+from server.models import ImportJob
+
+
+class FakeImport:
+    def __init__(self, error=None):
+        self.calls = 0
+        self.error = error
+
+    def __call__(self):
+        self.calls += 1
+        if self.error:
+            raise RuntimeError(self.error)
+
+
+@pytest.fixture
+def schedulers(app):
+    """schedulers(import_func) returns (web, runner) for one web worker and the scheduler process"""
+
+    def build(import_func):
+        web = ImportScheduler(app, scheduler=False, import_func=import_func)
+        runner = ImportScheduler(app, scheduler=True, poll_interval=3600, import_func=import_func)
+        return web, runner
+
+    return build
+
+
+def test_a_job_queued_by_any_worker_runs_once_in_the_scheduler(schedulers):
+    fake = FakeImport()
+    web, runner = schedulers(fake)
+
+    job_id = web.submit()
+    assert web.submit() == job_id  # coalesced while unfinished
+    assert web.get_job(job_id)['status'] == 'queued'
+    assert fake.calls == 0  # the web worker never runs imports
+
+    assert runner.run_pending() == 1
+    assert runner.run_pending() == 0
+
+    job = web.get_job(job_id)
+    assert fake.calls == 1
+    assert job['status'] == 'succeeded'
+    assert job['started_at'] and job['finished_at'].endswith('+00:00')
+
+
+def test_failures_are_recorded(schedulers):
+    web, runner = schedulers(FakeImport(error='upstream down'))
+
+    job_id = web.submit()
+    runner.run_pending()
+
+    job = web.get_job(job_id)
+    assert (job['status'], job['error']) == ('failed', 'upstream down')
+    assert web.submit() != job_id
+
+
+def test_starting_the_scheduler_fails_jobs_a_stopped_one_left_running(app, schedulers):
+    _, runner = schedulers(FakeImport())
+    with app.app_context():
+        db.session.add(ImportJob(id='stale', trigger='manual', status='running',
+                                 submitted_at=datetime.now(timezone.utc)))
+        db.session.commit()
+
+    runner.start()
+
+    assert runner.get_job('stale')['status'] == 'failed'
+
+
+def test_off_mode_skips_without_queuing(app):
+    fake = FakeImport()
+    scheduler = ImportScheduler(app, mode='off', import_func=fake)
+
+    job = scheduler.get_job(scheduler.submit())
+
+    assert job['status'] == 'skipped'
+    assert scheduler.run_pending() == 0 and fake.calls == 0
+
+
+def test_only_the_newest_finished_jobs_are_kept(app, schedulers, monkeypatch):
+    monkeypatch.setattr(import_jobs, 'MAX_JOB_HISTORY', 2)
+    web, runner = schedulers(FakeImport())
+
+    job_ids = []
+    for _ in range(4):
+        job_ids.append(web.submit())
+        runner.run_pending()
+
+    with app.app_context():
+        assert sorted(job.id for job in ImportJob.query) == sorted(job_ids[-2:])
+
+
+def test_import_endpoints_report_jobs_from_the_table(app):
+    client = app.test_client()
+
+    created = client.post('/api/import-events')
+    fetched = client.get(f"/api/import-events/{created.get_json()['id']}")
+
+    assert created.status_code == 202
+    assert fetched.get_json() == created.get_json()
+    assert client.get('/api/import-events/unknown').status_code == 404
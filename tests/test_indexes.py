@@ -0,0 +1,178 @@
+"""The hot paths are served by the indexes the migrations create.
+
+Each test runs the real route or helper, records the statements it sends
+to the database and checks SQLite's EXPLAIN QUERY PLAN for each of them.
+"""
+import re
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from server.block_cache import load_block_set
+from server.conversations import recent_conversations
+from server.extensions import db
+from server.models import ChatMessage, Event, User, user_event
+
+
+@pytest.fixture(autouse=True)
+def sqlite_only(app):
+    with app.app_context():
+        if db.engine.dialect.name != 'sqlite':
+            pytest.skip('EXPLAIN QUERY PLAN output is SQLite specific')
+
+
+@contextmanager
+def recorded_plans(app):
+    """Collect the plan of every statement run inside the block, as a list of lists of steps"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and re.match(r'\s*(SELECT|UPDATE|DELETE)', statement, re.IGNORECASE):
+            statements.append((statement, parameters))
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    plans = []
+    try:
+        yield plans
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    with app.app_context():
+        connection = db.session.connection()
+        for statement, parameters in statements:
+            rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)
+            plans.append([row[-1] for row in rows])
+
+
+def uses(plans, index_name):
+    return any(index_name in step for plan in plans for step in plan)
+
+
+def full_scans(plans):
+    """Steps that read a whole table rather than an index range or a materialized subquery"""
+    tables = set(db.metadata.tables)
+    return [step for plan in plans for step in plan
+            if re.match(r'SCAN (\w+)$', step) and step.split()[1] in tables]
+
+
+@pytest.fixture
+def event_id(app, users):
+    with app.app_context():
+        show = Event(name='Show', date='2030-07-01', venue_name='Hall', city='New York')
+        db.session.add(show)
+        db.session.flush()
+        db.session.execute(user_event.insert().values(user_id=users[1], event_id=show.id))
+        db.session.add(ChatMessage(event_id=show.id, user_id=users[0], username='alice1', message='hi'))
+        db.session.commit()
+        return show.id
+
+
+@pytest.fixture
+def conversation(login, users):
+    """alice and bob have exchanged messages, and alice has blocked carol"""
+    alice, bob, carol = users
+    for sender, receiver in ((alice, bob), (bob, alice)):
+        response = login(sender).post('/api/direct-messages', json={'receiver_id': receiver, 'message': 'hi'})
+        assert response.status_code == 201
+    assert login(alice).post(f'/api/users/{carol}/block').status_code in (200, 201)
+
+
+@pytest.mark.parametrize('path, index_name', [
+    # The latest messages for an open room, and older pages walked backwards by id
+    ('/api/events/{event_id}/chat_messages', 'ix_chat_message_event_id_id'),
+    ('/api/events/{event_id}/chat_messages?before=500', 'ix_chat_message_event_id_id'),
+    # Attendees of an event, serialized with their events and each event's photos
+    ('/api/events/{event_id}/rsvped-users', 'ix_user_event_event_id_user_id'),
+    ('/api/events/{event_id}/rsvped-users', 'ix_event_photos_event_id'),
+    ('/api/events/{event_id}/photos', 'ix_event_photos_event_id'),
+])
+def test_event_routes_use_indexes(app, login, users, event_id, path, index_name):
+    with recorded_plans(app) as plans:
+        response = login(users[0]).get(path.format(event_id=event_id))
+    assert response.status_code == 200
+
+    with app.app_context():
+        assert uses(plans, index_name), plans
+        assert not full_scans(plans), plans
+
+
+def test_direct_message_history_reads_one_conversation_range(app, login, users, conversation):
+    with recorded_plans(app) as plans:
+        response = login(users[0]).get(f'/api/direct-messages/{users[1]}')
+    assert len(response.get_json()) == 2
+
+    with app.app_context():
+        assert uses(plans, 'ix_direct_messages_conversation_id_id'), plans
+        assert not full_scans(plans), plans
+
+
+def test_mark_read_finds_the_watermark_and_unread_rows_by_index(app, login, users, conversation):
+    with recorded_plans(app) as plans:
+        login(users[1]).post(f'/api/direct-messages/mark-read/{users[0]}')
+
+    with app.app_context():
+        assert uses(plans, 'ix_direct_messages_sender_receiver_timestamp'), plans
+        assert uses(plans, 'ix_direct_messages_receiver_is_read'), plans
+        assert not full_scans(plans), plans
+
+
+@pytest.mark.parametrize('path', [
+    '/api/direct-messages/conversations',
+    '/api/direct-messages/conversations?limit=5',
+    '/api/direct-messages/recent?limit=5',
+])
+def test_conversation_lists_read_each_side_off_its_index(app, login, users, conversation, path):
+    with recorded_plans(app) as plans:
+        login(users[1]).get(path)
+
+    with app.app_context():
+        assert uses(plans, 'ix_conversations_user_a_id_last_timestamp'), plans
+        assert uses(plans, 'ix_conversations_user_b_id_last_timestamp'), plans
+        assert not full_scans(plans), plans
+
+
+def test_recent_conversations_with_a_cursor_stays_on_the_indexes(app, users, conversation):
+    with app.app_context():
+        newest = recent_conversations(users[0], 1).one()
+    with recorded_plans(app) as plans:
+        with app.app_context():
+            recent_conversations(users[0], 10, (newest.last_timestamp, newest.conversation_id)).all()
+
+    with app.app_context():
+        assert uses(plans, 'ix_conversations_user_a_id_last_timestamp'), plans
+        assert uses(plans, 'ix_conversations_user_b_id_last_timestamp'), plans
+        assert not full_scans(plans), plans
+
+
+def test_block_set_lookup_uses_an_index_for_each_direction(app, users, conversation):
+    with recorded_plans(app) as plans:
+        with app.app_context():
+            block_set = load_block_set(users[2])
+    assert block_set.blocked_by == {users[0]}
+
+    with app.app_context():
+        assert uses(plans, 'ix_user_blocks_blocked_id_blocker_id'), plans
+        assert not full_scans(plans), plans
+
+
+def test_friend_requests_are_found_from_both_sides(app, login, users):
+    assert login(users[0]).post('/api/friend-request', json={'receiver_id': users[1]}).status_code == 201
+    with recorded_plans(app) as plans:
+        login(users[1]).get('/api/friend-requests')
+
+    with app.app_context():
+        assert uses(plans, 'ix_friend_requests_sender_id_receiver_id'), plans
+        assert uses(plans, 'ix_friend_requests_receiver_id_sender_id'), plans
+        assert not full_scans(plans), plans
+
+
+def test_related_friends_backref_uses_the_reverse_index(app, users):
+    with recorded_plans(app) as plans:
+        with app.app_context():
+            db.session.get(User, users[0]).related_friends
+
+    with app.app_context():
+        assert uses(plans, 'ix_friend_association_friend_id_user_id'), plans
+        assert not full_scans(plans), plans
@@ -0,0 +1,109 @@
+"""Collectors and rendering of the Prometheus metrics, and what recording them costs"""
+import threading
+import time
+from types import SimpleNamespace
+
+from server.http_cache import HttpCache
+from server.metrics import MetricsRegistry, http_cache_collector, metrics, socketio_collector
+
+
+class FakeHttp:
+    """Answers every GET with the same body and ETag, or 304 once the ETag is sent back"""
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        if headers and headers.get('If-None-Match') == '"v1"':
+            return SimpleNamespace(status_code=304, content=b'', headers={})
+        return SimpleNamespace(status_code=200, content=b'{"data": []}', headers={'ETag': '"v1"'})
+
+
+def test_http_cache_collector_reports_each_result(tmp_path):
+    cache = HttpCache(str(tmp_path), ttl=60)
+    registry = MetricsRegistry()
+    registry.add_collector(http_cache_collector(cache))
+    http = FakeHttp()
+
+    cache.get(http, 'http://upstream/events')
+    cache.get(http, 'http://upstream/events')
+    cache.ttl = 0
+    cache.get(http, 'http://upstream/events')
+
+    rendered = registry.render()
+    assert '# TYPE edmtrain_http_cache_requests_total counter' in rendered
+    assert 'edmtrain_http_cache_requests_total{result="misses"} 1' in rendered
+    assert 'edmtrain_http_cache_requests_total{result="hits"} 1' in rendered
+    assert 'edmtrain_http_cache_requests_total{result="revalidated"} 1' in rendered
+
+
+def test_socketio_collector_summarises_chat_rooms_without_a_series_per_room():
+    sids = iter(range(1000))
+    rooms = {None: {}, 'user_1': {}}
+    for event_id, size in ((1, 1), (2, 3), (3, 3), (4, 40), ('lounge', 700)):
+        rooms[f'event_{event_id}'] = {next(sids): None for _ in range(size)}
+    rooms[None] = {sid: None for sid in range(next(sids))}
+    socketio = SimpleNamespace(server=SimpleNamespace(manager=SimpleNamespace(rooms={'/': rooms})))
+    registry = MetricsRegistry()
+    registry.add_collector(socketio_collector(socketio, SimpleNamespace(count=lambda: 12)))
+
+    rendered = registry.render()
+
+    assert 'socketio_connections 747' in rendered
+    assert 'socketio_authenticated_connections 12' in rendered
+    assert 'socketio_chat_rooms 5' in rendered
+    assert 'socketio_chat_room_members 747' in rendered
+    assert 'socketio_chat_room_members_max 700' in rendered
+    assert 'socketio_chat_rooms_by_size{le="2"} 1' in rendered
+    assert 'socketio_chat_rooms_by_size{le="5"} 3' in rendered
+    assert 'socketio_chat_rooms_by_size{le="50"} 4' in rendered
+    assert 'socketio_chat_rooms_by_size{le="1000"} 5' in rendered
+    assert 'socketio_chat_rooms_by_size{le="+Inf"} 5' in rendered
+    assert 'room="' not in rendered
+
+
+def test_concurrent_observations_are_all_counted(capsys):
+    histogram = MetricsRegistry().histogram('bench_seconds', 'Benchmark observations')
+    child = histogram.labels()
+    threads, per_thread = 8, 50_000
+
+    def observe():
+        for _ in range(per_thread):
+            child.observe(0.003)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=observe) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    counts, _ = child.snapshot()
+    assert sum(counts) == threads * per_thread
+    with capsys.disabled():
+        print(f"\nHistogram observe() across {threads} threads: "
+              f"{elapsed / (threads * per_thread) * 1e6:.2f}us per call")
+
+
+def test_recording_a_request_costs_a_small_fraction_of_serving_it(app, capsys):
+    client = app.test_client()
+    requests = 2000
+    assert client.get('/api/check_session').status_code == 204
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        client.get('/api/check_session')
+    per_request = (time.perf_counter() - started) / requests
+
+    # What metrics adds to each request: the after_request and teardown hooks
+    response = app.response_class(status=204)
+    with app.test_request_context('/api/check_session'):
+        started = time.perf_counter()
+        for _ in range(requests):
+            metrics._remember_status(response)
+            metrics._observe_request(None)
+        recording = (time.perf_counter() - started) / requests
+
+    assert metrics.enabled
+    assert recording < per_request * 0.05
+    with capsys.disabled():
+        print(f"\nGET /api/check_session: {per_request * 1e6:.0f}us per request, "
+              f"{recording * 1e6:.1f}us of it recording metrics ({recording / per_request:.2%})")
@@ -0,0 +1,71 @@
+"""Compiled response schemas match to_dict() and are measured against it"""
+import time
+
+import pytest
+
+from server.extensions import db
+from server.models import Event, EventPhoto, User, user_event
+from server.serializers import EVENT_SCHEMA, USER_SCHEMA
+
+BENCHMARK_ROWS = 10_000
+
+
+def schema_fields(data, schema):
+    """`data` (a to_dict() result) cut down to the fields `schema` returns"""
+    trimmed = {name: data[name] for name in schema.fields}
+    for name, child in schema.nested.items():
+        trimmed[name] = [schema_fields(item, child) for item in data[name]]
+    return trimmed
+
+
+@pytest.fixture
+def events(app_context):
+    db.session.execute(Event.__table__.insert(), [
+        dict(name=f'Show {number}', date='2030-07-01', venue_name='Hall', city='New York', source='test',
+             external_id=str(number))
+        for number in range(BENCHMARK_ROWS)
+    ])
+    event_ids = [row.id for row in db.session.query(Event.id).order_by(Event.id)]
+    db.session.execute(EventPhoto.__table__.insert(), [
+        dict(url=f'https://example.com/{event_id}.jpg', event_id=event_id) for event_id in event_ids[::10]
+    ])
+    db.session.commit()
+    return event_ids
+
+
+def test_event_schema_matches_to_dict(events):
+    with_photo = db.session.get(Event, events[0])
+    without_photo = db.session.get(Event, events[1])
+
+    for event in (with_photo, without_photo):
+        assert EVENT_SCHEMA.serialize(event) == schema_fields(event.to_dict(), EVENT_SCHEMA)
+
+
+def test_user_schema_leaves_out_the_password_hash(app_context, users, events):
+    db.session.execute(user_event.insert().values(user_id=users[0], event_id=events[0]))
+    db.session.commit()
+    user = db.session.get(User, users[0])
+
+    data = USER_SCHEMA.serialize(user)
+
+    assert data == schema_fields(user.to_dict(), USER_SCHEMA)
+    assert '_hashed_password' in user.to_dict() and '_hashed_password' not in data
+
+
+def test_schema_serializes_10k_events_faster_than_to_dict(events, capsys):
+    def measure(serialize_all):
+        db.session.expire_all()
+        started = time.perf_counter()
+        payload = serialize_all()
+        return time.perf_counter() - started, payload
+
+    to_dict_seconds, expected = measure(lambda: [event.to_dict() for event in Event.query.order_by(Event.id)])
+    schema_seconds, payload = measure(
+        lambda: EVENT_SCHEMA.serialize_many(EVENT_SCHEMA.query(Event.query.order_by(Event.id)).all())
+    )
+
+    assert payload == [schema_fields(event, EVENT_SCHEMA) for event in expected]
+    assert schema_seconds < to_dict_seconds
+    with capsys.disabled():
+        print(f"\nSerialize {BENCHMARK_ROWS} events with photos: to_dict() {to_dict_seconds:.2f}s, "
+              f"EVENT_SCHEMA {schema_seconds:.2f}s ({to_dict_seconds / schema_seconds:.1f}x)")
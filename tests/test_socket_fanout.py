@@ -0,0 +1,162 @@
+"""Chat fan-out between workers that share a Socket.IO message queue.
+
+Flask-SocketIO's test client refuses to run with a message queue, so both
+workers are served over HTTP on local ports and the clients connect like
+browsers do (long-polling, with the session cookie for authentication).
+"""
+import threading
+import time
+from collections import Counter
+
+import pytest
+import socketio as socketio_client
+from flask import Flask
+from flask_socketio import SocketIO, join_room
+from werkzeug.serving import make_server
+
+from server import chat_event, chat_room
+from server.extensions import db
+from server.models import Event, User
+from server.socket_queue import message_queue_options
+
+
+def serve(wsgi_app):
+    """Serve an app on a free local port in the background; returns (url, server)"""
+    server = make_server('127.0.0.1', 0, wsgi_app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}', server
+
+
+def wait_for(received, timeout=3.0):
+    """Wait until the list filled by a client's event handler is non-empty"""
+    deadline = time.monotonic() + timeout
+    while not received and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return received
+
+
+@pytest.fixture(scope='module')
+def worker_a(app):
+    """The application itself, as one worker on the in-process queue"""
+    assert app.config['SOCKETIO_MESSAGE_QUEUE'] == 'memory://'
+    url, server = serve(app)
+    yield url
+    server.shutdown()
+
+
+@pytest.fixture(scope='module')
+def worker_b(app):
+    """A second worker subscribed to the same queue and channel, with only a join handler"""
+    other_app = Flask('worker_b')
+    other_socketio = SocketIO(other_app, async_mode='threading', **message_queue_options(app.config))
+
+    @other_socketio.on('join_room')
+    def handle_join(data):
+        join_room(chat_room(data['event_id']))
+        return {}
+
+    url, server = serve(other_app)
+    yield url
+    server.shutdown()
+
+
+@pytest.fixture
+def member(app):
+    """A user's session cookie and an event they can chat in"""
+    with app.app_context():
+        user = User(username='fanout1', age=30, email_address='fanout@example.com', _hashed_password='x')
+        event = Event(name='Fan-out Fest', date='2030-06-01', venue_name='Hall', city='New York')
+        db.session.add_all([user, event])
+        db.session.commit()
+        user_id, event_id = user.id, event.id
+    session = app.session_interface.get_signing_serializer(app).dumps({'user_id': user_id})
+    return f"{app.config['SESSION_COOKIE_NAME']}={session}", event_id
+
+
+@pytest.fixture
+def connect():
+    """Connect Socket.IO clients that collect one event's payloads; all are disconnected afterwards"""
+    clients = []
+
+    def connect(url, event_name, cookie=None):
+        client = socketio_client.Client()
+        received = []
+        client.on(event_name, received.append)
+        client.connect(url, headers={'Cookie': cookie} if cookie else {}, transports=['polling'])
+        clients.append(client)
+        return client, received
+
+    yield connect
+    for client in clients:
+        client.disconnect()
+
+
+def test_message_sent_on_worker_a_reaches_room_member_on_worker_b(worker_a, worker_b, member, connect):
+    cookie, event_id = member
+    listener, listener_received = connect(worker_b, chat_event(event_id))
+    listener.call('join_room', {'event_id': event_id})
+
+    sender, sender_received = connect(worker_a, chat_event(event_id), cookie)
+    assert sender.call('join_room', {'event_id': event_id}) == {}
+    payload, status = sender.call('send_message', {'event_id': event_id, 'message': 'hello from A'})
+    assert status == 201
+
+    assert [message['message'] for message in wait_for(listener_received)] == ['hello from A']
+    assert listener_received[0]['seq'] == payload['seq']
+    # The sender's own worker delivers it through the queue as well
+    assert [message['message'] for message in wait_for(sender_received)] == ['hello from A']
+
+
+def test_room_members_of_other_events_on_worker_b_receive_nothing(worker_a, worker_b, member, connect):
+    cookie, event_id = member
+    listener, listener_received = connect(worker_b, chat_event(event_id))
+    listener.call('join_room', {'event_id': event_id + 1000})
+
+    sender, sender_received = connect(worker_a, chat_event(event_id), cookie)
+    sender.call('join_room', {'event_id': event_id})
+    sender.call('send_message', {'event_id': event_id, 'message': 'only for this room'})
+
+    assert wait_for(sender_received)
+    assert wait_for(listener_received, timeout=0.5) == []
+
+
+def room_emit_seconds(total_connections, room_size, messages=200, repeat=5):
+    """Seconds per chat message emitted to a room of `room_size` among `total_connections` sockets.
+
+    The sockets are registered straight with a python-socketio server's room
+    manager and Engine.IO delivery only counts packets, so the timing covers
+    the fan-out itself: finding the room's members and queueing a packet for each.
+    The best of `repeat` rounds is reported, as timeit does.
+    """
+    server = socketio_client.Server(async_mode='threading')
+    delivered = Counter()
+    server.eio.send_packet = lambda eio_sid, packet: delivered.update((eio_sid,))
+    event_id = 7
+    for number in range(total_connections):
+        sid = server.manager.connect(f'eio-{number}', '/')
+        server.manager.enter_room(sid, '/', chat_room(event_id if number < room_size else number))
+
+    payload = {'event_id': event_id, 'user_id': 1, 'username': 'fanout1', 'message': 'hello'}
+    rounds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(messages):
+            server.emit(chat_event(event_id), payload, to=chat_room(event_id))
+        rounds.append((time.perf_counter() - started) / messages)
+
+    assert delivered == {f'eio-{number}': messages * repeat for number in range(room_size)}
+    return min(rounds)
+
+
+def test_chat_fan_out_cost_follows_room_size_not_total_connections(capsys):
+    small_server = room_emit_seconds(total_connections=1_000, room_size=50)
+    small_room = room_emit_seconds(total_connections=50_000, room_size=50)
+    large_room = room_emit_seconds(total_connections=50_000, room_size=1_000)
+
+    # 50x the connections leaves a 50-member room's cost about where it was;
+    # 20x the members in the room multiplies it
+    assert small_room < small_server * 3
+    assert large_room > small_room * 5
+    with capsys.disabled():
+        print(f"\nChat emit per message: 50 of 1k sockets {small_server * 1e6:.0f}us, "
+              f"50 of 50k {small_room * 1e6:.0f}us, 1k of 50k {large_room * 1e6:.0f}us")
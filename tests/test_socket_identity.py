@@ -0,0 +1,45 @@
+"""Socket identities re-read what other workers can change on every send"""
+import pytest
+
+from server.extensions import db
+from server.models import User, UserBlock
+from server.socket_identity import SocketIdentities
+
+
+@pytest.fixture
+def identities():
+    return SocketIdentities()
+
+
+def test_a_block_made_elsewhere_applies_to_the_next_direct_message(app_context, identities, users):
+    alice, bob, _ = users
+    identity = identities.authenticate('sid-1', alice)
+    assert not identities.refresh('sid-1', identity, bob).blocked
+
+    # As if blocked through another worker: nothing in this process is told
+    db.session.add(UserBlock(blocker_id=bob, blocked_id=alice))
+    db.session.commit()
+
+    sender = identities.refresh('sid-1', identity, bob)
+    assert sender.blocked and sender.receiver_exists
+
+
+def test_a_missing_receiver_is_reported(app_context, identities, users):
+    identity = identities.authenticate('sid-1', users[0])
+
+    assert not identities.refresh('sid-1', identity, 10 ** 6).receiver_exists
+
+
+def test_renames_and_deletions_made_elsewhere_are_picked_up(app_context, identities, users):
+    alice = users[0]
+    identity = identities.authenticate('sid-1', alice)
+
+    db.session.get(User, alice).username = 'alice2'
+    db.session.commit()
+    identities.refresh('sid-1', identity)
+    assert identity.username == 'alice2'
+
+    db.session.delete(db.session.get(User, alice))
+    db.session.commit()
+    assert identities.refresh('sid-1', identity) is None
+    assert identities.get('sid-1') is None
@@ -0,0 +1,59 @@
+"""Peak memory of a buffered list response against the streamed one from iter_json_array()"""
+import json
+import os
+import subprocess
+import sys
+
+from server.extensions import db
+from server.models import Event
+
+STREAM_ROWS = 500_000
+SEED_BATCH_SIZE = 50_000
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run in a fresh interpreter so ru_maxrss only reflects the one request it makes
+MEASURE_REQUEST = '''
+import json
+import resource
+import sys
+
+from app import app
+
+client = app.test_client()
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+response = client.get(sys.argv[1], buffered=False)
+size = sum(len(chunk) for chunk in response.response)
+response.close()
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"status": response.status_code, "bytes": size, "growth_kb": peak - baseline}))
+'''
+
+
+def measure(url):
+    """Status, body size and peak RSS growth (in KiB) of one GET `url` in a child process"""
+    result = subprocess.run(
+        [sys.executable, '-c', MEASURE_REQUEST, url],
+        cwd=REPO_ROOT, env=os.environ.copy(), capture_output=True, text=True, check=True
+    )
+    # config.py prints the database URI on import, so the result is the last line
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_streamed_events_use_a_fraction_of_the_buffered_peak_rss(app_context, capsys):
+    for start in range(0, STREAM_ROWS, SEED_BATCH_SIZE):
+        db.session.execute(Event.__table__.insert(), [
+            dict(name=f'Show {number}', date='2030-07-01', venue_name='Hall', city='New York', source='test',
+                 external_id=str(number))
+            for number in range(start, min(start + SEED_BATCH_SIZE, STREAM_ROWS))
+        ])
+    db.session.commit()
+
+    buffered = measure('/api/events')
+    streamed = measure('/api/events?stream=true')
+
+    assert buffered['status'] == streamed['status'] == 200
+    assert min(buffered['bytes'], streamed['bytes']) > STREAM_ROWS * 100
+    assert streamed['growth_kb'] * 4 < buffered['growth_kb']
+    with capsys.disabled():
+        print(f"\n/api/events with {STREAM_ROWS} rows: peak RSS +{buffered['growth_kb'] / 1024:.1f} MiB buffered, "
+              f"+{streamed['growth_kb'] / 1024:.1f} MiB streamed")